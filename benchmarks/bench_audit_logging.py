@@ -0,0 +1,43 @@
+"""
+Per-line cost of calculate_taxes_for_line with audit logging off, sampled
+(1 in 100) and full, writing to a temporary log file.
+
+    python benchmarks/bench_audit_logging.py [lines]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tax_engine  # noqa: E402
+
+
+def main(lines: int = 100_000):
+    data = {"hsn": "21069020", "base_price": 2000, "qty_uom": 1,
+            "gst_rate": 18, "interstate": False, "currency": "INR"}
+    with tempfile.TemporaryDirectory() as tmp:
+        file_handler = logging.FileHandler(os.path.join(tmp, "bench.log"))
+        file_handler.setFormatter(tax_engine.formatter)
+        tax_engine.logger.removeHandler(tax_engine.handler)
+        tax_engine.logger.addHandler(file_handler)
+        try:
+            print(f"{'mode':<10}{'ns/line':>10}")
+            for mode in ('off', 'sampled', 'full'):
+                tax_engine.configure_audit(mode, sample_every=100)
+                start = time.perf_counter()
+                for _ in range(lines):
+                    tax_engine.calculate_taxes_for_line(data)
+                elapsed = time.perf_counter() - start
+                print(f"{mode:<10}{elapsed / lines * 1e9:>10.0f}")
+        finally:
+            tax_engine.configure_audit()
+            tax_engine.logger.removeHandler(file_handler)
+            tax_engine.logger.addHandler(tax_engine.handler)
+            file_handler.close()
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
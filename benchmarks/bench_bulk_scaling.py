@@ -0,0 +1,55 @@
+"""
+Scaling of BulkEvaluator with the number of worker processes, against
+calculate_taxes_for_lines in this process.
+
+    python benchmarks/bench_bulk_scaling.py [lines] [workers...]
+
+Defaults to 400k lines at 1, 2, 4, 8, 16 and 32 workers. Pool start-up is
+excluded: each pool is warmed with one chunk per worker before timing.
+Counts above os.cpu_count() oversubscribe the machine and show it.
+"""
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tax_engine import (BulkEvaluator, BULK_CHUNK_LINES,  # noqa: E402
+                        calculate_taxes_for_lines, get_rules, logger)
+
+WORKERS = (1, 2, 4, 8, 16, 32)
+
+
+def make_lines(n: int, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    hsn = [h for h, r in get_rules().items()]
+    return [{"hsn": rnd.choice(hsn),
+             "base_price": rnd.uniform(10, 100000),
+             "qty_uom": rnd.randrange(0, 5000),
+             "weight_grams": rnd.randrange(0, 30_000_000),
+             "gst_rate": rnd.choice([5, 12, 18, 28]),
+             "interstate": rnd.random() < 0.5} for _ in range(n)]
+
+
+def main(n: int = 400_000, *workers: int):
+    logger.setLevel(logging.ERROR)
+    lines = make_lines(n)
+    start = time.perf_counter()
+    calculate_taxes_for_lines(lines)
+    base = n / (time.perf_counter() - start)
+    print(f"{os.cpu_count()} CPUs, {n:,} lines, chunks of {BULK_CHUNK_LINES:,}")
+    print(f"{'workers':>8}{'lines/s':>14}{'speedup':>10}")
+    print(f"{'in-proc':>8}{base:>14,.0f}{1:>9.2f}x")
+    for w in workers or WORKERS:
+        with BulkEvaluator(workers=w) as bulk:
+            bulk.evaluate(lines[:BULK_CHUNK_LINES * w])
+            start = time.perf_counter()
+            bulk.evaluate(lines)
+            rate = n / (time.perf_counter() - start)
+        print(f"{w:>8}{rate:>14,.0f}{rate / base:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
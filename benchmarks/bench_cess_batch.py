@@ -0,0 +1,55 @@
+"""
+Throughput of CompensationCessEngine.calculate_cess_batch vs. per-line calls.
+
+    python benchmarks/bench_cess_batch.py [sizes...]
+
+Sizes default to 10k, 1M and 10M lines. The scalar loop is timed on the
+first 10k lines only and extrapolated.
+"""
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tax_engine import get_engine, get_rules, logger  # noqa: E402
+
+SCALAR_SAMPLE = 10_000
+
+
+def make_lines(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    hsn = rng.choice(np.array(list(get_rules())), n)
+    tv = rng.uniform(10, 100000, n)
+    qty = rng.integers(0, 5000, n).astype(float)
+    wt = rng.uniform(0, 30, n)
+    return hsn, tv, qty, wt
+
+
+def main(sizes):
+    logger.setLevel(logging.ERROR)
+    engine = get_engine()
+    print(f"{'lines':>12}{'batch s':>10}{'lines/s':>14}{'scalar lines/s':>16}")
+    for n in sizes:
+        hsn, tv, qty, wt = make_lines(n)
+
+        start = time.perf_counter()
+        engine.calculate_cess_batch(hsn, tv, qty, wt)
+        batch_s = time.perf_counter() - start
+
+        m = min(n, SCALAR_SAMPLE)
+        calc = engine.calculate_cess
+        start = time.perf_counter()
+        for i in range(m):
+            calc(hsn[i], tv[i], qty[i], wt[i])
+        scalar_rate = m / (time.perf_counter() - start)
+
+        print(f"{n:>12,}{batch_s:>10.3f}{n / batch_s:>14,.0f}{scalar_rate:>16,.0f}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]] or [10_000, 1_000_000, 10_000_000]
+    main(args)
@@ -0,0 +1,54 @@
+"""
+Compiled rule evaluators vs. the interpreter-style rule walk.
+
+    python benchmarks/bench_compiled_rules.py [calls]
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tax_engine import get_engine, get_rules  # noqa: E402
+
+
+def interpret_rule(rule, transaction_value, quantity, weight_tonnes):
+    """The original if-chain, re-reading rule constants on every call."""
+    rtype = rule.get('type')
+    if rtype == 'ad_valorem':
+        return transaction_value * (rule['rate_percent'] / 100)
+    if rtype == 'fixed_per_unit':
+        return (quantity / rule['unit_count']) * rule['fixed_rate']
+    if rtype == 'per_weight':
+        return weight_tonnes * rule['rate_per_tonne']
+    if rtype == 'combined':
+        ad = transaction_value * (rule['rate_percent'] / 100)
+        pu = (quantity / rule['unit_count']) * rule['fixed_rate']
+        return ad + pu
+    if rtype == 'higher_of':
+        return max(interpret_rule(opt, transaction_value, quantity, weight_tonnes)
+                   for opt in rule['options'])
+    return 0.0
+
+
+def main(calls: int = 200_000):
+    rules = get_rules()
+    engine = get_engine()
+    samples = {}
+    for hsn, rule in rules.items():
+        samples.setdefault(rule['type'], hsn)
+
+    print(f"{'rule type':<16}{'interpreted ns':>16}{'compiled ns':>14}{'speedup':>10}")
+    for rtype, hsn in samples.items():
+        interp = timeit.timeit(
+            lambda: interpret_rule(rules.get(hsn), 1000.0, 1000.0, 2.5),
+            number=calls)
+        compiled = timeit.timeit(
+            lambda: engine.calculate_cess(hsn, 1000.0, 1000.0, 2.5),
+            number=calls)
+        print(f"{rtype:<16}{interp / calls * 1e9:>16.0f}"
+              f"{compiled / calls * 1e9:>14.0f}{interp / compiled:>10.2f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
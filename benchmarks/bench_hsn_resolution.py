@@ -0,0 +1,52 @@
+"""
+HSN resolution throughput: flat exact dict lookup vs. longest-prefix
+resolution (cold and cached).
+
+    python benchmarks/bench_hsn_resolution.py [lookups]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tax_engine import CompensationCessEngine  # noqa: E402
+
+
+def rate(n, fn):
+    start = time.perf_counter()
+    fn()
+    return n / (time.perf_counter() - start)
+
+
+def main(n: int = 1_000_000):
+    engine = CompensationCessEngine()
+    rnd = random.Random(0)
+    keys = [k for k in engine.rules if k.isdigit()]
+    exact = [rnd.choice(keys) for _ in range(n)]
+    # Tariff lines under the rule keys: resolved by prefix.
+    tariff = [k + f"{rnd.randrange(100):02d}" if len(k) < 8 else k for k in exact]
+    flat = engine.ruleset.rule_index
+
+    def flat_lookup():
+        get = flat.get
+        for h in exact:
+            get(h)
+
+    def resolve(codes):
+        def run():
+            res = engine.resolve_hsn
+            for h in codes:
+                res(h)
+        return run
+
+    print(f"{'flat dict, exact keys':<34}{rate(n, flat_lookup):>14,.0f} /s")
+    print(f"{'resolve_hsn, exact keys':<34}{rate(n, resolve(exact)):>14,.0f} /s")
+    engine._resolved.clear()
+    print(f"{'resolve_hsn, tariff lines (cold)':<34}{rate(n, resolve(tariff)):>14,.0f} /s")
+    print(f"{'resolve_hsn, tariff lines (warm)':<34}{rate(n, resolve(tariff)):>14,.0f} /s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
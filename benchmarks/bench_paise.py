@@ -0,0 +1,84 @@
+"""
+GST + cess with float+round, Decimal and integer paise, per line and
+vectorised.
+
+    python benchmarks/bench_paise.py [lines]
+"""
+import logging
+import os
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tax_engine import (GSTEngine, get_engine, get_rules, logger,  # noqa: E402
+                        rate_to_ppm, round_amount, round_amount_batch)
+
+CENT = Decimal("0.01")
+
+
+def timed(label, n, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{elapsed / n * 1e9:>10.0f} ns/line")
+
+
+def main(n: int = 200_000):
+    logger.setLevel(logging.ERROR)
+    rng = np.random.default_rng(0)
+    ad_valorem = [h for h, r in get_rules().items() if r['type'] == 'ad_valorem']
+    hsn = rng.choice(np.array(ad_valorem), n)
+    value = rng.integers(100, 10_000_000, n)          # paise
+    rate = rng.choice([5.0, 12.0, 18.0, 28.0], n)
+    inter = rng.random(n) < 0.5
+
+    engine, gst = get_engine(), GSTEngine()
+    rules = get_rules()
+    hsn_l, value_l, rate_l, inter_l = hsn.tolist(), value.tolist(), rate.tolist(), inter.tolist()
+    rupees_l = (value / 100).tolist()
+    rates_dec = {r: Decimal(str(r)) for r in set(rate_l)}
+    cess_dec = {h: Decimal(str(rules[h]['rate_percent'])) for h in set(hsn_l)}
+    ppm = {r: rate_to_ppm(r) for r in set(rate_l)}
+
+    def float_lines():
+        for h, v, r, i in zip(hsn_l, rupees_l, rate_l, inter_l):
+            cg, sg, ig = map(round_amount, gst.calculate_gst(v, r, i))
+            round_amount(engine.calculate_cess(h, v))
+
+    def decimal_lines():
+        for h, v, r, i in zip(hsn_l, value_l, rate_l, inter_l):
+            dv = Decimal(v) / 100
+            tax = dv * rates_dec[r] / 100
+            if not i:
+                (tax / 2).quantize(CENT, ROUND_HALF_UP)
+            else:
+                tax.quantize(CENT, ROUND_HALF_UP)
+            (dv * cess_dec[h] / 100).quantize(CENT, ROUND_HALF_UP)
+
+    def paise_lines():
+        for h, v, r, i in zip(hsn_l, value_l, rate_l, inter_l):
+            gst.calculate_gst_paise(v, ppm[r], i)
+            engine.calculate_cess_paise(h, v)
+
+    def float_batch():
+        values = value / 100
+        gst.calculate_gst_batch(values, rate, inter)
+        round_amount_batch(engine.calculate_cess_batch(hsn, values))
+
+    def paise_batch():
+        gst.calculate_gst_paise_batch(value, np.rint(rate * 10_000).astype(np.int64), inter)
+        engine.calculate_cess_paise_batch(hsn, value)
+
+    timed("per line: float + round", n, float_lines)
+    timed("per line: Decimal", n, decimal_lines)
+    timed("per line: int paise", n, paise_lines)
+    timed("batch: float + round", n, float_batch)
+    timed("batch: int64 paise", n, paise_batch)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200_000)
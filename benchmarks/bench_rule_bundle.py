@@ -0,0 +1,51 @@
+"""
+Rule-set startup cost: parsing and compiling JSON versus mapping a
+compiled bundle.
+
+    python benchmarks/bench_rule_bundle.py [rules]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from bench_rule_table_memory import synthetic_rules  # noqa: E402
+from tax_engine import RuleStore, load_rule_bundle, write_rule_bundle  # noqa: E402
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n: int = 200_000):
+    text = synthetic_rules(n)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "rules.json")
+        bundle_path = os.path.join(tmp, "rules.cessb")
+        with open(json_path, "w") as f:
+            f.write(text)
+
+        def from_json():
+            with open(json_path) as f:
+                RuleStore(json.load(f))
+
+        write_rule_bundle(json.loads(text), bundle_path)
+        print(f"{n:,} rules: JSON {len(text) / 2**20:.1f} MiB, "
+              f"bundle {os.path.getsize(bundle_path) / 2**20:.1f} MiB")
+        for label, fn in (("json.load + compile", from_json),
+                          ("mmap bundle", lambda: load_rule_bundle(bundle_path)),
+                          ("mmap bundle, no checksum",
+                           lambda: load_rule_bundle(bundle_path, verify=False))):
+            print(f"{label:<28}{timed(fn) * 1e3:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""
+Memory held by a large rule set: the parsed JSON dicts versus the compiled
+CessRuleSet (RuleTable columns plus the HSN → row index).
+
+    python benchmarks/bench_rule_table_memory.py [rules]
+"""
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tax_engine import CessRuleSet, RULES_PATH  # noqa: E402
+
+
+def synthetic_rules(n: int) -> str:
+    """n rules as JSON text, cycling the shipped rules over distinct HSNs."""
+    with open(RULES_PATH) as f:
+        templates = [r for r in json.load(f).values() if isinstance(r, dict)]
+    return json.dumps({f"{i:010d}": templates[i % len(templates)]
+                       for i in range(n)})
+
+
+def retained(build):
+    """Bytes still allocated after build() returns, and its result."""
+    gc.collect()
+    tracemalloc.start()
+    obj = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, obj
+
+
+def main(n: int = 200_000):
+    text = synthetic_rules(n)
+    raw_bytes, raw = retained(lambda: json.loads(text))
+    ruleset_bytes, ruleset = retained(lambda: CessRuleSet(raw))
+    table = ruleset.table
+    print(f"{n:,} rules, {len(table):,} table rows")
+    print(f"{'parsed JSON dicts':<28}{raw_bytes / 2**20:>10.1f} MiB"
+          f"{raw_bytes / n:>10.0f} B/rule")
+    print(f"{'CessRuleSet':<28}{ruleset_bytes / 2**20:>10.1f} MiB"
+          f"{ruleset_bytes / n:>10.0f} B/rule")
+    print(f"{'  of which columns':<28}{table.nbytes() / 2**20:>10.1f} MiB"
+          f"{table.nbytes() / n:>10.0f} B/rule")
+
+
+if __name__ == "__main__":
+    main(*(int(a) for a in sys.argv[1:]))
@@ -0,0 +1,202 @@
+"""
+Benchmark suite for the tax_engine hot paths, with a JSON baseline.
+
+    python benchmarks/suite.py run [--output FILE] [--only SUBSTR] [--repeat N]
+    python benchmarks/suite.py compare BASELINE [--current FILE] [--threshold 0.25]
+
+run times every benchmark and writes {"meta": ..., "metrics": {name:
+{"ns_per_op": ...}}} (default benchmarks/baseline.json). compare runs the
+suite again (or reads --current) and exits 1 if any metric is slower than
+the baseline by more than the threshold (a fraction; 0.25 = 25%).
+
+Workloads are synthetic and deterministic, sampled from cess_rules.json;
+nothing touches the network. Logging and audit records are switched off so
+the numbers measure computation, not I/O. Each timing repeats a metric's
+workload until it lasts at least 0.1 s, and the metric is the fastest of
+--repeat timings; the minimum is far less sensitive to scheduler noise
+than the mean. Baselines are per machine: compare against one recorded on
+the same hardware.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import tax_engine  # noqa: E402
+from tax_engine import (GSTEngine, app, calculate_taxes_for_line,  # noqa: E402
+                        calculate_taxes_for_lines, get_engine, get_rules)
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+WORKLOAD = 2000
+# Each timing repeats the workload until it lasts at least this long.
+MIN_TIMING_NS = 100_000_000
+
+
+def sample_lines(n: int, hsns: list, seed: int = 0) -> list:
+    rnd = random.Random(seed)
+    return [{"hsn": rnd.choice(hsns),
+             "base_price": round(rnd.uniform(10, 100000), 2),
+             "qty_uom": rnd.randrange(0, 5000),
+             "weight_grams": rnd.randrange(0, 30_000_000),
+             "gst_rate": rnd.choice([5, 12, 18, 28]),
+             "interstate": rnd.random() < 0.5,
+             "currency": "INR"} for _ in range(n)]
+
+
+def benchmarks() -> dict:
+    """{name: (fn, ops)}; fn() runs the workload once, performing ops operations."""
+    engine, gst = get_engine(), GSTEngine()
+    by_type = {}
+    for hsn, rule in get_rules().items():
+        by_type.setdefault(rule["type"], []).append(hsn)
+    lines = sample_lines(WORKLOAD, list(get_rules()))
+    suite = {}
+
+    for rtype, hsns in sorted(by_type.items()):
+        args = [(line["hsn"], line["base_price"], line["qty_uom"],
+                 line["weight_grams"] / 1_000_000)
+                for line in sample_lines(WORKLOAD, hsns, seed=1)]
+
+        def cess(args=args):
+            calc = engine.calculate_cess
+            for a in args:
+                calc(*a)
+        suite[f"calculate_cess.{rtype}"] = (cess, len(args))
+
+    gst_args = [(line["base_price"], line["gst_rate"], line["interstate"]) for line in lines]
+
+    def gst_calc():
+        calc = gst.calculate_gst
+        for a in gst_args:
+            calc(*a)
+    suite["calculate_gst"] = (gst_calc, len(gst_args))
+
+    def per_line():
+        for line in lines:
+            calculate_taxes_for_line(line, engine=engine)
+    suite["calculate_taxes_for_line"] = (per_line, len(lines))
+
+    suite["calculate_taxes_for_lines"] = (
+        lambda: calculate_taxes_for_lines(lines, engine=engine), len(lines))
+
+    rng = np.random.default_rng(0)
+    hsn_col = [line["hsn"] for line in lines] * 50
+    n = len(hsn_col)
+    cols = rng.uniform(10, 1e5, n), rng.integers(0, 5000, n), rng.uniform(0, 30, n)
+    suite["calculate_cess_batch"] = (
+        lambda: engine.calculate_cess_batch(hsn_col, *cols), n)
+
+    client = app.test_client()
+    urls = ["/api/taxes?" + urlencode(line) for line in lines[:200]]
+
+    def api():
+        for url in urls:
+            client.get(url)
+    suite["api_taxes"] = (api, len(urls))
+    return suite
+
+
+def timed(fn, loops: int) -> int:
+    start = time.perf_counter_ns()
+    for _ in range(loops):
+        fn()
+    return time.perf_counter_ns() - start
+
+
+def calibrate(fn) -> int:
+    """Passes per timing, doubled until one timing takes MIN_TIMING_NS."""
+    loops = 1
+    while timed(fn, loops) < MIN_TIMING_NS:
+        loops *= 2
+    return loops
+
+
+def run(only: str = "", repeat: int = 5) -> dict:
+    tax_engine.logger.setLevel(logging.ERROR)
+    tax_engine.configure_audit("off")
+    metrics = {}
+    for name, (fn, ops) in benchmarks().items():
+        if only not in name:
+            continue
+        loops = calibrate(fn)
+        times = [timed(fn, loops) for _ in range(repeat)]
+        metrics[name] = {"ns_per_op": round(min(times) / (ops * loops), 1),
+                         "ops": ops * loops}
+        print(f"{name:<36}{metrics[name]['ns_per_op']:>12,.0f} ns/op", flush=True)
+    return {"meta": {"created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                     "python": platform.python_version(),
+                     "numpy": np.__version__,
+                     "machine": platform.machine(),
+                     "cpus": os.cpu_count(),
+                     "repeat": repeat},
+            "metrics": metrics}
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """Print a comparison table; return the names of regressed metrics."""
+    regressed = []
+    print(f"{'metric':<36}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, cur in current["metrics"].items():
+        base = baseline["metrics"].get(name)
+        if base is None:
+            print(f"{name:<36}{'-':>12}{cur['ns_per_op']:>12,.0f}{'new':>9}")
+            continue
+        change = cur["ns_per_op"] / base["ns_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            regressed.append(name)
+            flag = "  REGRESSED"
+        print(f"{name:<36}{base['ns_per_op']:>12,.0f}{cur['ns_per_op']:>12,.0f}"
+              f"{change:>+9.1%}{flag}")
+    return regressed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_cmd = commands.add_parser("run")
+    run_cmd.add_argument("--output", default=DEFAULT_BASELINE)
+    cmp_cmd = commands.add_parser("compare")
+    cmp_cmd.add_argument("baseline")
+    cmp_cmd.add_argument("--current", help="results file instead of a fresh run")
+    cmp_cmd.add_argument("--threshold", type=float, default=0.25)
+    for cmd in (run_cmd, cmp_cmd):
+        cmd.add_argument("--only", default="", help="run metrics whose name contains this")
+        cmd.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(args.only, args.repeat)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"wrote {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if args.current:
+        with open(args.current) as f:
+            current = json.load(f)
+    else:
+        current = run(args.only, args.repeat)
+    regressed = compare(baseline, current, args.threshold)
+    if regressed:
+        print(f"{len(regressed)} metric(s) regressed by more than "
+              f"{args.threshold:.0%}: {', '.join(regressed)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,21 +1,370 @@
 # tax_engine.py
 
 import os
+import sys
+import csv
 import json
+import queue
+import hashlib
+import hmac
+import mmap
+import struct
+import atexit
 import logging
-from functools import lru_cache
+import logging.handlers
+import threading
+import time
+import weakref
+import argparse
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from functools import partial, wraps
+from itertools import count, islice, repeat
 from typing import Optional
-from flask import Flask, request, jsonify
+import numpy as np
+from flask import Flask, Response, request, jsonify, stream_with_context
 
 # —————————————————————————————————————————————————————
 # Logging Configuration
+LOG_PATH = "tax_engine.log"
+
 logger = logging.getLogger("TaxEngine")
 logger.setLevel(logging.INFO)
-handler = logging.FileHandler("tax_engine.log")
+handler = logging.FileHandler(LOG_PATH)
 formatter = logging.Formatter('%(asctime)s %(levelname)s:%(name)s:%(message)s')
 handler.setFormatter(formatter)
 logger.addHandler(handler)
 
+# Async mode: request threads only enqueue records; a background thread
+# formats and writes them in batches. Enable with enable_async_logging() or
+# TAX_ENGINE_ASYNC_LOG=1 (queue bound via TAX_ENGINE_ASYNC_LOG_QUEUE).
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that never blocks: when the queue is full the record is
+    dropped and counted. Records are enqueued unformatted, so formatting
+    also happens on the writer thread.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class _BatchFileHandler(logging.FileHandler):
+    """FileHandler that flushes once per batch instead of once per record."""
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+class AsyncLogWriter:
+    """
+    Background thread draining the log queue into a file, up to batch_size
+    records per write. stop() drains what is queued and flushes.
+    """
+    _STOP = object()
+
+    def __init__(self, log_queue: queue.Queue, file_handler: _BatchFileHandler,
+                 batch_size: int = 256):
+        self.queue = log_queue
+        self.handler = file_handler
+        self.batch_size = batch_size
+        self._thread = threading.Thread(target=self._run, name="TaxEngineLogWriter",
+                                        daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        # A blocking put: the writer is draining, so room frees up promptly.
+        self.queue.put(self._STOP)
+        self._thread.join()
+        self.handler.close()
+
+    def _run(self):
+        get, get_nowait = self.queue.get, self.queue.get_nowait
+        stopping = False
+        while not stopping:
+            batch = [get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(get_nowait())
+                except queue.Empty:
+                    break
+            for record in batch:
+                if record is self._STOP:
+                    stopping = True
+                    continue
+                self.handler.handle(record)
+            self.handler.flush_batch()
+
+_async_writer: Optional[AsyncLogWriter] = None
+_queue_handler: Optional[_DroppingQueueHandler] = None
+
+def enable_async_logging(queue_size: int = 10_000, batch_size: int = 256,
+                         path: Optional[str] = None) -> AsyncLogWriter:
+    """
+    Switch the TaxEngine logger to non-blocking mode. At most queue_size
+    records are buffered; beyond that records are dropped and counted
+    (see async_log_dropped). The queue is flushed at interpreter exit.
+    """
+    global _async_writer, _queue_handler
+    disable_async_logging()
+    log_queue = queue.Queue(maxsize=queue_size)
+    file_handler = _BatchFileHandler(path or LOG_PATH)
+    file_handler.setFormatter(formatter)
+    _async_writer = AsyncLogWriter(log_queue, file_handler, batch_size)
+    _async_writer.start()
+    _queue_handler = _DroppingQueueHandler(log_queue)
+    logger.removeHandler(handler)
+    logger.addHandler(_queue_handler)
+    return _async_writer
+
+def disable_async_logging():
+    """
+    Flush queued records and return to the synchronous file handler.
+    Registered with atexit, so pending records are written on shutdown.
+    """
+    global _async_writer, _queue_handler
+    if _async_writer is None:
+        return
+    logger.removeHandler(_queue_handler)
+    _async_writer.stop()
+    logger.addHandler(handler)
+    if _queue_handler.dropped:
+        logger.warning(f"Async logging dropped {_queue_handler.dropped} records")
+    _async_writer = None
+    _queue_handler = None
+
+def async_log_dropped() -> int:
+    """Records dropped because the async log queue was full."""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+def _reset_worker_logging():
+    """
+    Make a worker process log synchronously to the async log's file. A
+    forked child inherits the queue handler but not the writer thread, so
+    its records would never be written; a spawned child's writer would
+    lose queued records, as pool workers exit without running atexit.
+    """
+    global _async_writer, _queue_handler
+    if _async_writer is None:
+        return
+    writer, path = _async_writer, _async_writer.handler.baseFilename
+    logger.removeHandler(_queue_handler)
+    if writer._thread.is_alive():
+        writer.stop()
+    _async_writer = _queue_handler = None
+    worker_handler = logging.FileHandler(path)
+    worker_handler.setFormatter(formatter)
+    logger.addHandler(worker_handler)
+
+atexit.register(disable_async_logging)
+
+if os.environ.get("TAX_ENGINE_ASYNC_LOG") == "1":
+    enable_async_logging(
+        queue_size=int(os.environ.get("TAX_ENGINE_ASYNC_LOG_QUEUE", 10_000)))
+
+# —————————————————————————————————————————————————————
+# Metrics
+#
+# In-process instruments exposed on /metrics in the Prometheus text format.
+# Counters and histograms keep one shard per thread: the hot path updates
+# its own thread's dict without a lock, and a scrape sums the shards (the
+# lock is only taken when a thread creates or retires its shard or a scrape
+# lists them). When a thread exits its shard is folded into a shared base,
+# so thread-per-request servers do not accumulate shards. Label values are
+# passed as a tuple, in labelnames order.
+
+class _ShardHolder:
+    """Thread-local owner of a shard; its finalizer retires the shard."""
+    __slots__ = ("shard", "__weakref__")
+
+    def __init__(self, shard: dict):
+        self.shard = shard
+
+class _ShardedMetric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = {}
+        self._base = {}
+        self._shard_ids = count()
+        self._lock = threading.Lock()
+        (registry or METRICS).register(self)
+
+    def _new_shard(self) -> dict:
+        shard = {}
+        key = next(self._shard_ids)
+        with self._lock:
+            self._shards[key] = shard
+        holder = self._local.holder = _ShardHolder(shard)
+        # The thread's locals are released when it exits.
+        weakref.finalize(holder, self._retire, key)
+        return shard
+
+    def _retire(self, key: int):
+        with self._lock:
+            shard = self._shards.pop(key)
+            for labels, value in shard.items():
+                # Replaced, not updated in place: a scrape may be reading it.
+                self._base[labels] = self._merge(self._base.get(labels), value)
+
+    def _merge(self, total, value):
+        raise NotImplementedError
+
+    def _collect(self) -> list:
+        # Under the lock so a shard retired mid-scrape is not counted twice.
+        # list(dict.items()) runs without releasing the GIL, so a shard
+        # being updated by its thread is read consistently.
+        with self._lock:
+            return [list(shard.items())
+                    for shard in [self._base, *self._shards.values()]]
+
+    def _labels(self, values: tuple, extra: str = "") -> str:
+        pairs = [f'{k}="{_escape_label(str(v))}"' for k, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter(_ShardedMetric):
+    kind = "counter"
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        try:
+            shard = self._local.holder.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, total, value):
+        return value if total is None else total + value
+
+    def value(self, labels: tuple = ()) -> float:
+        return sum(v for items in self._collect() for k, v in items if k == labels)
+
+    def samples(self):
+        totals = {}
+        for items in self._collect():
+            for labels, v in items:
+                totals[labels] = totals.get(labels, 0) + v
+        for labels, v in sorted(totals.items()):
+            yield f"{self.name}_total{self._labels(labels)} {v}"
+
+class Histogram(_ShardedMetric):
+    kind = "histogram"
+
+    # Seconds; suited to per-request latency.
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                       0.1, 0.25, 0.5, 1.0, 2.5)
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (),
+                 buckets: tuple = DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value: float, labels: tuple = ()):
+        try:
+            shard = self._local.holder.shard
+        except AttributeError:
+            shard = self._new_shard()
+        # [count per bucket..., count above the last bucket, sum]
+        cells = shard.get(labels)
+        if cells is None:
+            cells = shard[labels] = [0] * (len(self.buckets) + 2)
+        cells[bisect_left(self.buckets, value)] += 1
+        cells[-1] += value
+
+    def _merge(self, total, cells):
+        cells = list(cells)
+        return cells if total is None else [t + c for t, c in zip(total, cells)]
+
+    def samples(self):
+        totals = {}
+        for items in self._collect():
+            for labels, cells in items:
+                total = totals.setdefault(labels, [0] * len(cells))
+                for i, c in enumerate(list(cells)):
+                    total[i] += c
+        for labels, cells in sorted(totals.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), cells):
+                cumulative += c
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                bucket = self._labels(labels, f'le="{le}"')
+                yield f"{self.name}_bucket{bucket} {cumulative}"
+            yield f"{self.name}_sum{self._labels(labels)} {cells[-1]}"
+            yield f"{self.name}_count{self._labels(labels)} {cumulative}"
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, registry=None):
+        self.name = name
+        self.help = help
+        self._value = 0.0
+        (registry or METRICS).register(self)
+
+    def set(self, value: float):
+        self._value = value
+
+    def value(self) -> float:
+        return self._value
+
+    def samples(self):
+        yield f"{self.name} {self._value}"
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        out = []
+        for metric in self._metrics:
+            # Counter samples carry the _total suffix; HELP/TYPE must match.
+            name = metric.name + "_total" if metric.kind == "counter" else metric.name
+            out.append(f"# HELP {name} {metric.help}")
+            out.append(f"# TYPE {name} {metric.kind}")
+            out.extend(metric.samples())
+        return "\n".join(out) + "\n"
+
+METRICS = MetricsRegistry()
+
+REQUESTS = Counter("tax_engine_requests", "API requests by endpoint and HTTP status.",
+                   ("endpoint", "status"))
+REQUEST_SECONDS = Histogram("tax_engine_request_duration_seconds",
+                            "API request latency by endpoint.", ("endpoint",))
+CESS_EVALUATIONS = Counter("tax_engine_cess_evaluations",
+                           "Cess rule evaluations by rule type.", ("rule_type",))
+CESS_RULE_MISSES = Counter("tax_engine_cess_rule_misses",
+                           "Cess lookups with no rule for the HSN.")
+RULESET_LOADS = Counter("tax_engine_ruleset_loads", "Rule store loads and reloads.")
+RULESET_LOAD_SECONDS = Gauge("tax_engine_ruleset_load_seconds",
+                             "Time taken by the last rule store load.")
+
 # —————————————————————————————————————————————————————
 # Utilities
 
@@ -23,80 +372,1079 @@ def round_amount(amount: float, ndigits: int = 2) -> float:
     """Round to currency precision by default."""
     return round(amount, ndigits)
 
-def convert_to_inr(amount: float, currency: str) -> float:
+def round_amount_batch(amounts, ndigits: int = 2) -> np.ndarray:
+    """
+    Vectorised round_amount with results identical to Python's round().
+
+    np.round scales by 10**ndigits in floating point, which misrounds values
+    that sit within an ulp of a half. Here the scaled value is computed
+    exactly as a double-double (Dekker split + TwoSum), so ties are detected
+    on the true value and broken half-to-even like round(). Valid for
+    0 <= ndigits <= 8 and |amount| * 10**ndigits < 2**52.
+    """
+    x = np.asarray(amounts, dtype=np.float64)
+    scale = float(10 ** ndigits)
+    # Split x into 26-bit halves so each half * scale is exact.
+    c = 134217729.0 * x
+    x_hi = c - (c - x)
+    x_lo = x - x_hi
+    a = x_hi * scale
+    b = x_lo * scale
+    # TwoSum: a + b == scaled + err exactly.
+    scaled = a + b
+    bb = scaled - a
+    err = (a - (scaled - bb)) + (b - bb)
+    floor = np.floor(scaled)
+    frac = scaled - floor
+    tie = frac == 0.5
+    up = (frac > 0.5) | (tie & ((err > 0) | ((err == 0) & (np.fmod(floor, 2) != 0))))
+    return (floor + up) / scale
+
+# Fixed-point mode: amounts are integer paise, rates are integer parts per
+# million of the amount (18% → 180_000), quantities are thousandths of a unit
+# and weights are grams. Every division rounds half away from zero (see
+# _div_round), so per-line paise add up to invoice totals exactly.
+PAISE_PER_RUPEE = 100
+RATE_SCALE = 1_000_000
+QTY_SCALE = 1000
+
+def to_paise(amount: float) -> int:
+    """Rupee amount → integer paise (nearest paisa)."""
+    return int(round(amount * PAISE_PER_RUPEE))
+
+def rate_to_ppm(rate_percent: float) -> int:
+    """Percentage rate → integer parts per million."""
+    return int(round(rate_percent * (RATE_SCALE // 100)))
+
+def _div_round(num, den):
+    """
+    num / den rounded half away from zero, for den > 0. Works on Python ints
+    and on int64 arrays alike.
+    """
+    q = (2 * abs(num) + den) // (2 * den)
+    if isinstance(q, np.ndarray):
+        return np.where(num < 0, -q, q)
+    return -q if num < 0 else q
+
+# —————————————————————————————————————————————————————
+# FX Rates
+#
+# Exchange rates (INR per unit of foreign currency) come from a pluggable
+# FXProvider. A provider loads (currency, effective date, rate) rows into an
+# FXRateTable once per TTL period; lookups are a dict hit plus a bisect over
+# that currency's effective dates. Currencies without a rate are remembered
+# until the next refresh, so each one warns once per period, not per line.
+
+# Rates used when no provider is configured.
+DEFAULT_FX_RATES = {"USD": 82.5, "EUR": 90.0}
+# Seconds between provider reloads.
+FX_TTL_SECONDS = 3600.0
+
+class FXRateTable:
+    """
+    Indexed, read-only rate table. A rate applies from its effective date
+    (None: always) until the currency's next rate starts.
+    """
+    def __init__(self, rows):
+        dated = {}
+        for currency, effective, rate in rows:
+            start = _as_date(effective).toordinal() if effective else 0
+            dated.setdefault(currency.upper(), {})[start] = float(rate)
+        self.currencies = {}
+        for currency, by_start in dated.items():
+            starts = sorted(by_start)
+            self.currencies[currency] = (starts, [by_start[s] for s in starts])
+
+    def __len__(self) -> int:
+        return len(self.currencies)
+
+    def lookup(self, currency: str, ordinal: int) -> Optional[float]:
+        """Rate for currency (upper case) on a date ordinal, or None."""
+        entry = self.currencies.get(currency)
+        if entry is None:
+            return None
+        i = bisect_right(entry[0], ordinal) - 1
+        return entry[1][i] if i >= 0 else None
+
+class FXProvider:
+    """
+    Base class for FX rate sources. Subclasses implement load(), returning
+    an iterable of (currency, effective_date or None, rate) rows. If a
+    reload fails the previous table is kept until the next TTL period.
+    """
+    def __init__(self, ttl: float = FX_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._table = FXRateTable(())
+        self._expires_at = 0.0
+        # Negative cache: currencies already reported missing this period.
+        self._missing = set()
+
+    def load(self):
+        raise NotImplementedError
+
+    def refresh(self, force: bool = True):
+        """
+        Reload the rate table and clear the negative cache. With force=False
+        this is a no-op if the table has not expired, so threads that all
+        saw the old expiry reload once, not once each.
+        """
+        with self._lock:
+            if not force and time.monotonic() < self._expires_at:
+                return
+            try:
+                table = FXRateTable(self.load())
+                logger.info(f"Loaded FX rates for {len(table)} currencies")
+                self._table = table
+            except Exception as e:
+                logger.exception(f"Failed to load FX rates: {e}")
+            self._missing = set()
+            self._expires_at = time.monotonic() + self.ttl
+
+    def table(self) -> FXRateTable:
+        """The current rate table, reloading it once the TTL has passed."""
+        if time.monotonic() >= self._expires_at:
+            self.refresh(force=False)
+        return self._table
+
+    def _report_missing(self, currency: str):
+        if currency not in self._missing:
+            self._missing.add(currency)
+            logger.warning(f"No FX rate for {currency}, assuming 1:1")
+
+    def rate(self, currency: str, on=None) -> Optional[float]:
+        """
+        INR per unit of currency on date `on` (a date or ISO string;
+        default today). None, with one warning per currency per period,
+        if there is no rate.
+        """
+        table = self.table()
+        ordinal = (date.today() if on is None else _as_date(on)).toordinal()
+        rate = table.lookup(currency, ordinal)
+        if rate is None:
+            rate = table.lookup(currency.upper(), ordinal)
+            if rate is None:
+                self._report_missing(currency)
+        return rate
+
+    def rates_batch(self, currencies, on=None) -> tuple:
+        """
+        Vectorised rate() over a column of currency codes. on is one date
+        for every line or a per-line sequence/array of dates (None entries
+        mean today). The column is factorised once and each distinct
+        currency's rates are gathered in one step. Returns (rates, unknown):
+        float64 rates with 1.0 for INR and for lines without a rate, and a
+        bool mask of the lines without a rate.
+        """
+        table = self.table()
+        if isinstance(currencies, np.ndarray):
+            currencies = currencies.tolist()
+        n = len(currencies)
+        uniques = {}
+        codes = np.fromiter((uniques.setdefault(c, len(uniques)) for c in currencies),
+                            dtype=np.intp, count=n)
+        per_line = on is not None and not isinstance(on, (str, date))
+        if per_line:
+            ordinals = _date_ordinals(on)
+        else:
+            ordinal = (date.today() if on is None else _as_date(on)).toordinal()
+
+        lut = np.ones(len(uniques))
+        missing = np.zeros(len(uniques), dtype=bool)
+        dated = []
+        for currency, k in uniques.items():
+            if currency == 'INR':
+                continue
+            entry = (table.currencies.get(currency)
+                     or table.currencies.get(currency.upper()))
+            if entry is not None and per_line:
+                dated.append((currency, k, entry))
+                continue
+            i = -1 if entry is None else bisect_right(entry[0], ordinal) - 1
+            if i >= 0:
+                lut[k] = entry[1][i]
+            else:
+                missing[k] = True
+                self._report_missing(currency)
+        rates = lut[codes]
+        unknown = missing[codes]
+        for currency, k, (starts, values) in dated:
+            sel = np.flatnonzero(codes == k)
+            i = np.searchsorted(starts, ordinals[sel], side='right') - 1
+            found = i >= 0
+            rates[sel[found]] = np.asarray(values)[i[found]]
+            if not found.all():
+                unknown[sel[~found]] = True
+                self._report_missing(currency)
+        return rates, unknown
+
+class StaticFXProvider(FXProvider):
+    """Fixed {currency: rate} mapping, in force on every date."""
+    def __init__(self, rates: Optional[dict] = None, ttl: float = float('inf')):
+        super().__init__(ttl)
+        self.rates = dict(DEFAULT_FX_RATES if rates is None else rates)
+
+    def load(self):
+        return [(currency, None, rate) for currency, rate in self.rates.items()]
+
+class FileFXProvider(FXProvider):
+    """
+    Rates from a local file, re-read every ttl seconds:
+      - CSV with a header row of currency,date,rate (date may be empty)
+      - JSON, either a list of {"currency", "date", "rate"} objects or
+        {currency: rate | {date: rate}}
+    """
+    def __init__(self, path: str, ttl: float = FX_TTL_SECONDS):
+        super().__init__(ttl)
+        self.path = path
+
+    def load(self):
+        with open(self.path, newline='') as f:
+            if self.path.lower().endswith('.csv'):
+                return [(row['currency'], row.get('date') or None, row['rate'])
+                        for row in csv.DictReader(f)]
+            data = json.load(f)
+        if isinstance(data, list):
+            return [(row['currency'], row.get('date'), row['rate']) for row in data]
+        rows = []
+        for currency, value in data.items():
+            if isinstance(value, dict):
+                rows.extend((currency, d, rate) for d, rate in value.items())
+            else:
+                rows.append((currency, None, value))
+        return rows
+
+_fx_provider: Optional[FXProvider] = None
+
+def set_fx_provider(provider: Optional[FXProvider]):
+    """Install the process-wide FX provider (None restores the default)."""
+    global _fx_provider
+    _fx_provider = provider
+
+def get_fx_provider() -> FXProvider:
     """
-    Stub for currency conversion. Integrate with real FX rates.
+    The process-wide FX provider: a FileFXProvider on $TAX_ENGINE_FX_RATES
+    if set, else StaticFXProvider(DEFAULT_FX_RATES).
     """
-    rates = {"USD": 82.5, "EUR": 90.0}  
-    rate = rates.get(currency.upper())
+    global _fx_provider
+    provider = _fx_provider
+    if provider is None:
+        path = os.environ.get("TAX_ENGINE_FX_RATES")
+        provider = FileFXProvider(path) if path else StaticFXProvider()
+        _fx_provider = provider
+    return provider
+
+def convert_to_inr(amount: float, currency: str, on=None) -> float:
+    """
+    Convert amount to INR at the provider's rate on date `on` (default
+    today). Unknown currencies are passed through 1:1.
+    """
+    rate = get_fx_provider().rate(currency, on)
     if rate is None:
-        logger.warning(f"No FX rate for {currency}, assuming 1:1")
         return amount
     return amount * rate
 
+def convert_to_inr_batch(amounts: np.ndarray, currencies, on=None) -> np.ndarray:
+    """
+    Vectorised convert_to_inr: multiplies the float64 array amounts by each
+    line's INR rate in place (see FXProvider.rates_batch for on). Lines in
+    an unknown currency are left as they are; returns their bool mask.
+    """
+    rates, unknown = get_fx_provider().rates_batch(currencies, on)
+    amounts *= rates
+    return unknown
+
+# —————————————————————————————————————————————————————
+# Rule Compiler
+#
+# A rule set is compiled once, at load time, into a RuleTable: one row per
+# rule, a kind code per row and parallel typed columns holding each rule's
+# pre-divided constants. higher_of rows point into option_rows through an
+# (opt_start, opt_count) offset pair; the options themselves are ordinary
+# rows. The HSN → row map is the only dict.
+#
+# The kernels below take (columns, row, ...) and read the constants they
+# need. With the table's array.array columns and an int row they score one
+# line with plain Python floats and ints; with the NumPy views in
+# RuleTable.np and an index array they score a whole batch with the same
+# arithmetic. The float kernels take (transaction_value, quantity,
+# weight_tonnes); the paise kernels take (value_paise, quantity_milli,
+# weight_grams) and round each component half away from zero.
+
+_AD_VALOREM, _FIXED_PER_UNIT, _PER_WEIGHT, _COMBINED, _HIGHER_OF = range(5)
+
+_RULE_KINDS = {
+    'ad_valorem': _AD_VALOREM,
+    'fixed_per_unit': _FIXED_PER_UNIT,
+    'per_weight': _PER_WEIGHT,
+    'combined': _COMBINED,
+    'higher_of': _HIGHER_OF,
+}
+_KIND_NAMES = {kind: name for name, kind in _RULE_KINDS.items()}
+# Metric label tuples by kind code.
+_KIND_LABELS = tuple((_KIND_NAMES[kind],) for kind in range(len(_KIND_NAMES)))
+
+_FLOAT_COLUMNS = ('rate_percent', 'rate', 'fixed_rate', 'unit_count',
+                  'per_unit', 'per_tonne')
+_INT_COLUMNS = ('rate_ppm', 'fixed_paise', 'unit_milli', 'tonne_paise',
+                'opt_start', 'opt_count')
+# Every RuleTable column and its array typecode, in storage order.
+_COLUMN_TYPES = {'kind': 'b', **dict.fromkeys(_FLOAT_COLUMNS, 'd'),
+                 **dict.fromkeys(_INT_COLUMNS, 'q'), 'option_rows': 'q'}
+
+def _ad_valorem(c, r, transaction_value, quantity, weight_tonnes):
+    return transaction_value * c.rate[r]
+
+def _fixed_per_unit(c, r, transaction_value, quantity, weight_tonnes):
+    return quantity * c.per_unit[r]
+
+def _per_weight(c, r, transaction_value, quantity, weight_tonnes):
+    return weight_tonnes * c.per_tonne[r]
+
+def _combined(c, r, transaction_value, quantity, weight_tonnes):
+    return transaction_value * c.rate[r] + quantity * c.per_unit[r]
+
+def _higher_of(c, r, transaction_value, quantity, weight_tonnes):
+    best = 0.0
+    start = c.opt_start[r]
+    for o in c.option_rows[start:start + c.opt_count[r]]:
+        amount = _FLOAT_KERNELS[c.kind[o]](c, o, transaction_value, quantity, weight_tonnes)
+        if amount > best:
+            best = amount
+    return best
+
+def _ad_valorem_paise(c, r, value_paise, quantity_milli, weight_grams):
+    return _div_round(value_paise * c.rate_ppm[r], RATE_SCALE)
+
+def _fixed_per_unit_paise(c, r, value_paise, quantity_milli, weight_grams):
+    return _div_round(quantity_milli * c.fixed_paise[r], c.unit_milli[r])
+
+def _per_weight_paise(c, r, value_paise, quantity_milli, weight_grams):
+    return _div_round(weight_grams * c.tonne_paise[r], 1_000_000)
+
+def _combined_paise(c, r, value_paise, quantity_milli, weight_grams):
+    # Each component is rounded to paise, then summed.
+    return (_div_round(value_paise * c.rate_ppm[r], RATE_SCALE)
+            + _div_round(quantity_milli * c.fixed_paise[r], c.unit_milli[r]))
+
+def _higher_of_paise(c, r, value_paise, quantity_milli, weight_grams):
+    best = 0
+    start = c.opt_start[r]
+    for o in c.option_rows[start:start + c.opt_count[r]]:
+        amount = _PAISE_KERNELS[c.kind[o]](c, o, value_paise, quantity_milli, weight_grams)
+        if amount > best:
+            best = amount
+    return best
+
+_FLOAT_KERNELS = (_ad_valorem, _fixed_per_unit, _per_weight, _combined, _higher_of)
+_PAISE_KERNELS = (_ad_valorem_paise, _fixed_per_unit_paise, _per_weight_paise,
+                  _combined_paise, _higher_of_paise)
+
+def _evaluate_rows(c, rows: np.ndarray, cols: list, paise: bool = False) -> np.ndarray:
+    """
+    Batch kernel dispatch: score line i with rule row rows[i] over the
+    NumPy columns c. Lines are grouped by kind and each group is evaluated
+    in one pass; higher_of groups take the elementwise maximum over option
+    slot 0, 1, ... of their rows.
+    """
+    kernels = _PAISE_KERNELS if paise else _FLOAT_KERNELS
+    out = np.zeros(len(rows), dtype=np.int64 if paise else np.float64)
+    kinds = c.kind[rows]
+    for kind in np.unique(kinds):
+        sel = np.flatnonzero(kinds == kind)
+        r = rows[sel]
+        args = [col[sel] for col in cols]
+        if kind != _HIGHER_OF:
+            out[sel] = kernels[kind](c, r, *args)
+            continue
+        start = c.opt_start[r]
+        count = c.opt_count[r]
+        best = out[sel]
+        for k in range(int(count.max())):
+            has = np.flatnonzero(count > k)
+            # Options are never higher_of themselves (they are flattened).
+            amounts = _evaluate_rows(c, c.option_rows[start[has] + k],
+                                     [a[has] for a in args], paise)
+            best[has] = np.maximum(best[has], amounts)
+        out[sel] = best
+    return out
+
+def _compile_spec(rule: dict) -> dict:
+    """
+    Validate one JSON rule and fold its constants into a row spec. Nested
+    higher_of options are flattened, since max(a, max(b, c)) == max(a, b, c).
+    Raises ValueError for an unknown rule type or a higher_of without options.
+    """
+    rtype = rule.get('type')
+    kind = _RULE_KINDS.get(rtype)
+    if kind is None:
+        raise ValueError(f"Unknown rule type '{rtype}'")
+    spec = {'kind': kind}
+    if kind == _HIGHER_OF:
+        options = []
+        for opt in rule['options']:
+            compiled = _compile_spec(opt)
+            if compiled['kind'] == _HIGHER_OF:
+                options.extend(compiled['options'])
+            else:
+                options.append(compiled)
+        if not options:
+            raise ValueError("higher_of rule has no options")
+        spec['options'] = options
+    if kind in (_AD_VALOREM, _COMBINED):
+        spec['rate_percent'] = rule['rate_percent']
+        spec['rate'] = rule['rate_percent'] / 100
+        spec['rate_ppm'] = rate_to_ppm(rule['rate_percent'])
+    if kind in (_FIXED_PER_UNIT, _COMBINED):
+        spec['fixed_rate'] = rule['fixed_rate']
+        spec['unit_count'] = rule['unit_count']
+        spec['per_unit'] = rule['fixed_rate'] / rule['unit_count']
+        spec['fixed_paise'] = to_paise(rule['fixed_rate'])
+        spec['unit_milli'] = int(rule['unit_count'] * QTY_SCALE)
+    if kind == _PER_WEIGHT:
+        spec['per_tonne'] = float(rule['rate_per_tonne'])
+        spec['tonne_paise'] = to_paise(rule['rate_per_tonne'])
+    return spec
+
+class RuleTable:
+    """
+    Column store for a set of compiled cess rules (see the section comment).
+    index maps each HSN key to its row; option rows of higher_of rules are
+    not indexed. np holds read-only NumPy views of the same columns for the
+    batch path. Invalid rules are logged and left out.
+    """
+    def __init__(self, rules: dict):
+        for name, typecode in _COLUMN_TYPES.items():
+            setattr(self, name, array(typecode))
+        self.index = {}
+        for hsn, rule in rules.items():
+            try:
+                spec = _compile_spec(rule)
+            except Exception as e:
+                logger.error(f"Invalid cess rule for HSN {hsn}: {e}")
+                continue
+            self.index[hsn] = self._append(spec)
+        self.np = _TableViews(self)
+
+    @classmethod
+    def from_buffers(cls, columns: dict, index: dict) -> "RuleTable":
+        """
+        Table over existing buffers (e.g. memoryviews of a mapped rule
+        bundle), one per _COLUMN_TYPES entry. The buffers are not copied.
+        """
+        table = cls.__new__(cls)
+        for name in _COLUMN_TYPES:
+            setattr(table, name, columns[name])
+        table.index = index
+        table.np = _TableViews(table)
+        return table
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    # Pickled without the NumPy views; they are rebuilt over the new buffers.
+    # Columns backed by a mapped bundle are copied into arrays.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['np']
+        for name, typecode in _COLUMN_TYPES.items():
+            if not isinstance(state[name], array):
+                state[name] = array(typecode, state[name])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.np = _TableViews(self)
+
+    def _append(self, spec: dict) -> int:
+        option_rows = [self._append(opt) for opt in spec.get('options', ())]
+        row = len(self.kind)
+        self.kind.append(spec['kind'])
+        for name in _FLOAT_COLUMNS:
+            getattr(self, name).append(spec.get(name, 0.0))
+        for name in ('rate_ppm', 'fixed_paise', 'unit_milli', 'tonne_paise'):
+            getattr(self, name).append(spec.get(name, 0))
+        self.opt_start.append(len(self.option_rows))
+        self.opt_count.append(len(option_rows))
+        self.option_rows.extend(option_rows)
+        return row
+
+    def to_rule(self, row: int) -> dict:
+        """Rebuild the JSON rule for a row (options flattened)."""
+        kind = self.kind[row]
+        rule = {'type': _KIND_NAMES[kind]}
+        if kind == _HIGHER_OF:
+            start = self.opt_start[row]
+            rule['options'] = [self.to_rule(o) for o in
+                               self.option_rows[start:start + self.opt_count[row]]]
+        if kind in (_AD_VALOREM, _COMBINED):
+            rule['rate_percent'] = self.rate_percent[row]
+        if kind in (_FIXED_PER_UNIT, _COMBINED):
+            rule['fixed_rate'] = self.fixed_rate[row]
+            rule['unit_count'] = self.unit_count[row]
+        if kind == _PER_WEIGHT:
+            rule['rate_per_tonne'] = self.per_tonne[row]
+        return rule
+
+    def view(self, row: int) -> "_RuleView":
+        return _RuleView(self, row)
+
+    def nbytes(self) -> int:
+        """Bytes held by the column buffers (excluding the HSN index)."""
+        return sum(len(col) * col.itemsize for col in
+                   (getattr(self, name) for name in _COLUMN_TYPES))
+
+class _TableViews:
+    """NumPy views over a RuleTable's columns, sharing its buffers."""
+    def __init__(self, table: RuleTable):
+        for name, typecode in _COLUMN_TYPES.items():
+            setattr(self, name, np.frombuffer(getattr(table, name), dtype=typecode))
+
+class _RuleView:
+    """
+    One row of a RuleTable, usable like a compiled evaluator:
+    view(transaction_value, quantity, weight_tonnes), view.paise(...), and
+    column values as attributes (view.rate, view.per_unit, ...).
+    """
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: RuleTable, row: int):
+        self.table = table
+        self.row = row
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)[self.row]
+
+    @property
+    def options(self) -> tuple:
+        start = self.opt_start
+        return tuple(_RuleView(self.table, o) for o in
+                     self.table.option_rows[start:start + self.opt_count])
+
+    def __call__(self, transaction_value, quantity, weight_tonnes):
+        return _FLOAT_KERNELS[self.kind](self.table, self.row,
+                                         transaction_value, quantity, weight_tonnes)
+
+    def paise(self, value_paise, quantity_milli, weight_grams):
+        return _PAISE_KERNELS[self.kind](self.table, self.row,
+                                         value_paise, quantity_milli, weight_grams)
+
+def compile_rule(rule: dict) -> _RuleView:
+    """
+    Compile one JSON rule into a single-row evaluator.
+    Raises ValueError for an unknown rule type.
+    """
+    _compile_spec(rule)
+    return RuleTable({'': rule}).view(0)
+
+def compile_rules(rules: dict) -> dict:
+    """
+    Compile a {hsn: rule} mapping into {hsn: evaluator}, all rows of one
+    RuleTable. Invalid rules are logged and left out.
+    """
+    table = RuleTable(rules)
+    return {hsn: table.view(row) for hsn, row in table.index.items()}
+
+class CessRuleSet:
+    """
+    A compiled, read-only rule set: the RuleTable, the HSN → row index and
+    the longest-prefix index. version is a hash of the rules' canonical
+    JSON, so every worker that loads the same rules reports the same
+    version. The raw rules are not kept; rules rebuilds them from the table.
+    """
+    def __init__(self, rules: dict):
+        canonical = json.dumps(rules, sort_keys=True).encode()
+        self._bind(RuleTable(rules), hashlib.sha256(canonical).hexdigest()[:12])
+
+    @classmethod
+    def from_table(cls, table: RuleTable, version: str) -> "CessRuleSet":
+        """Rule set over an already compiled table (see load_rule_bundle)."""
+        ruleset = cls.__new__(cls)
+        ruleset._bind(table, version)
+        return ruleset
+
+    def _bind(self, table: RuleTable, version: str):
+        self.table = table
+        self.rule_index = table.index
+        # Distinct lengths of all-digit rule keys, longest first.
+        self.prefix_lengths = sorted({len(h) for h in self.rule_index if h.isdigit()},
+                                     reverse=True)
+        # Bounded cache of prefix resolutions (see resolve_hsn).
+        self.resolved = {}
+        self.version = version
+
+    def __len__(self) -> int:
+        return len(self.rule_index)
+
+    @property
+    def rules(self) -> dict:
+        """{hsn: rule} rebuilt from the table (valid rules only)."""
+        return {hsn: self.table.to_rule(row) for hsn, row in self.rule_index.items()}
+
+    @property
+    def evaluators(self) -> dict:
+        """{hsn: evaluator} views onto the table."""
+        return {hsn: self.table.view(row) for hsn, row in self.rule_index.items()}
+
+def _as_date(value) -> date:
+    """date, datetime or ISO 'YYYY-MM-DD' string → date."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str):
+        return date.fromisoformat(value[:10])
+    raise TypeError(f"Expected a date, got {type(value).__name__}")
+
+# date(1970, 1, 1).toordinal(): converts datetime64[D] day counts to ordinals.
+_EPOCH_ORDINAL = 719163
+
+def _date_ordinals(values) -> np.ndarray:
+    """Per-line dates (datetime64 array, or dates/ISO strings/None) → ordinals."""
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        return values.astype('datetime64[D]').astype(np.int64) + _EPOCH_ORDINAL
+    today = date.today().toordinal()
+    return np.fromiter((today if v is None else _as_date(v).toordinal() for v in values),
+                       dtype=np.int64, count=len(values))
+
+class RuleStore:
+    """
+    Effective-dated cess rules. In the rules file an HSN maps either to one
+    rule, in force throughout, or to a list of rules that each carry an ISO
+    "effective_from" date (inclusive); a version applies until the next one
+    starts. The timeline is cut at every effective_from date into periods,
+    each with its own CessRuleSet, and at(as_of) finds the period by bisect
+    over the sorted period starts.
+    """
+    def __init__(self, raw: dict):
+        versions = {}
+        change_dates = set()
+        for hsn, entry in raw.items():
+            dated = []
+            for rule in (entry if isinstance(entry, list) else [entry]):
+                start = rule.get('effective_from')
+                start = _as_date(start).toordinal() if start else 0
+                dated.append((start, rule))
+                if start:
+                    change_dates.add(start)
+            dated.sort(key=lambda d: d[0])
+            versions[hsn] = ([d[0] for d in dated], [d[1] for d in dated])
+
+        # Period i covers [starts[i], starts[i + 1]); 0 stands for "always".
+        self.starts = [0] + sorted(change_dates)
+        self.rulesets = []
+        for start in self.starts:
+            rules_at = {}
+            for hsn, (hsn_starts, rules) in versions.items():
+                i = bisect_right(hsn_starts, start) - 1
+                if i >= 0:
+                    rules_at[hsn] = rules[i]
+            self.rulesets.append(CessRuleSet(rules_at))
+        self._starts_array = np.array(self.starts, dtype=np.int64)
+        self._engines = [None] * len(self.starts)
+
+    @classmethod
+    def from_periods(cls, starts: list, rulesets: list) -> "RuleStore":
+        """Store over compiled periods (see load_rule_bundle)."""
+        store = cls.__new__(cls)
+        store.starts = list(starts)
+        store.rulesets = list(rulesets)
+        store._starts_array = np.array(store.starts, dtype=np.int64)
+        store._engines = [None] * len(store.starts)
+        return store
+
+    def __getstate__(self):
+        # Engines are per process; they are recreated on first use.
+        state = self.__dict__.copy()
+        state['_engines'] = [None] * len(self.starts)
+        return state
+
+    def period_index(self, as_of: date) -> int:
+        return bisect_right(self.starts, as_of.toordinal()) - 1
+
+    def period_indices(self, ordinals: np.ndarray) -> np.ndarray:
+        """Vectorised period_index over date ordinals."""
+        return np.searchsorted(self._starts_array, ordinals, side='right') - 1
+
+    def at(self, as_of: date) -> CessRuleSet:
+        """The rule set in force on as_of."""
+        return self.rulesets[self.period_index(as_of)]
+
+    def current(self) -> CessRuleSet:
+        return self.at(date.today())
+
+    def engine_for_period(self, index: int) -> "CompensationCessEngine":
+        """Engine bound to one period, created once per store."""
+        engine = self._engines[index]
+        if engine is None:
+            engine = CompensationCessEngine(ruleset=self.rulesets[index], store=self)
+            self._engines[index] = engine
+        return engine
+
+    def engine_at(self, as_of: date) -> "CompensationCessEngine":
+        return self.engine_for_period(self.period_index(as_of))
+
+    def expiry(self, as_of: date) -> float:
+        """Epoch time at which the period containing as_of ends (inf if never)."""
+        index = self.period_index(as_of)
+        if index + 1 >= len(self.starts):
+            return float('inf')
+        return datetime.combine(date.fromordinal(self.starts[index + 1]),
+                                datetime.min.time()).timestamp()
+
+def _as_column(values, n: int) -> np.ndarray:
+    """float64 column of length n; None means missing (NaN) for every line."""
+    if values is None:
+        return np.full(n, np.nan)
+    return np.asarray(values, dtype=np.float64)
+
+# —————————————————————————————————————————————————————
+# Binary Rule Bundles
+#
+# write_rule_bundle compiles a rules file once into a binary bundle that
+# load_rule_bundle maps read-only with mmap: the RuleTable columns of every
+# period are used in place, so processes on one host share the same physical
+# pages and startup does no JSON parsing or rule compilation.
+#
+# Layout (little-endian, sections 8-byte aligned):
+#   header   magic, format version, period count, SHA-256 of the payload,
+#            payload length
+#   payload  one directory entry per period (start ordinal, version, row,
+#            option and key counts, key blob length), then per period: the
+#            _COLUMN_TYPES columns in order, the rows of the sorted HSN keys
+#            and the keys themselves, NUL-separated UTF-8.
+
+RULE_BUNDLE_MAGIC = b"CESSBNDL"
+RULE_BUNDLE_FORMAT = 1
+RULE_BUNDLE_SUFFIX = ".cessb"
+_BUNDLE_HEADER = struct.Struct("<8sII32sQ")
+_BUNDLE_PERIOD = struct.Struct("<q16sQQQQ")
+
+def _pad8(n: int) -> int:
+    return -n % 8
+
+def write_rule_bundle(rules, path: str):
+    """
+    Compile rules (a {hsn: rule} mapping as in cess_rules.json, or a
+    RuleStore) and write them to a bundle at path. The file is written
+    aside and renamed into place, so processes that still map the old
+    bundle keep a consistent view.
+    """
+    store = rules if isinstance(rules, RuleStore) else RuleStore(rules)
+    directory, sections = [], []
+    for start, ruleset in zip(store.starts, store.rulesets):
+        table = ruleset.table
+        keys = sorted(ruleset.rule_index)
+        blob = "\0".join(keys).encode()
+        directory.append(_BUNDLE_PERIOD.pack(
+            start, ruleset.version.encode(), len(table), len(table.option_rows),
+            len(keys), len(blob)))
+        for name, typecode in _COLUMN_TYPES.items():
+            data = array(typecode, getattr(table, name)).tobytes()
+            sections += [data, bytes(_pad8(len(data)))]
+        sections.append(array('q', (ruleset.rule_index[k] for k in keys)).tobytes())
+        sections += [blob, bytes(_pad8(len(blob)))]
+    payload = b"".join(directory + sections)
+    header = _BUNDLE_HEADER.pack(RULE_BUNDLE_MAGIC, RULE_BUNDLE_FORMAT,
+                                 len(store.starts), hashlib.sha256(payload).digest(),
+                                 len(payload))
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'wb') as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(tmp, path)
+
+def load_rule_bundle(path: str, verify: bool = True) -> RuleStore:
+    """
+    Map a bundle written by write_rule_bundle and return its RuleStore.
+    Raises ValueError if the file is not a bundle, has another format
+    version or (with verify) fails its checksum.
+    """
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    view = memoryview(mapped)
+    if len(view) < _BUNDLE_HEADER.size:
+        raise ValueError(f"{path} is not a cess rule bundle")
+    magic, fmt, periods, digest, length = _BUNDLE_HEADER.unpack_from(view)
+    if magic != RULE_BUNDLE_MAGIC:
+        raise ValueError(f"{path} is not a cess rule bundle")
+    if fmt != RULE_BUNDLE_FORMAT:
+        raise ValueError(f"Unsupported rule bundle format {fmt} "
+                         f"(expected {RULE_BUNDLE_FORMAT})")
+    payload = view[_BUNDLE_HEADER.size:]
+    if len(payload) != length or (verify and hashlib.sha256(payload).digest() != digest):
+        raise ValueError(f"Rule bundle {path} failed its checksum")
+
+    offset = periods * _BUNDLE_PERIOD.size
+    starts, rulesets = [], []
+    for p in range(periods):
+        start, version, rows, options, nkeys, blob_len = _BUNDLE_PERIOD.unpack_from(
+            payload, p * _BUNDLE_PERIOD.size)
+        columns = {}
+        for name, typecode in _COLUMN_TYPES.items():
+            count = options if name == 'option_rows' else rows
+            size = count * array(typecode).itemsize
+            columns[name] = payload[offset:offset + size].cast(typecode)
+            offset += size + _pad8(size)
+        key_rows = payload[offset:offset + nkeys * 8].cast('q').tolist()
+        offset += nkeys * 8
+        blob = bytes(payload[offset:offset + blob_len]).decode()
+        offset += blob_len + _pad8(blob_len)
+        keys = blob.split("\0") if nkeys else []
+        table = RuleTable.from_buffers(columns, dict(zip(keys, key_rows)))
+        starts.append(start)
+        rulesets.append(CessRuleSet.from_table(table, version.rstrip(b"\0").decode()))
+    return RuleStore.from_periods(starts, rulesets)
+
+def _is_bundle(path: str) -> bool:
+    return path.endswith(RULE_BUNDLE_SUFFIX)
+
 # —————————————————————————————————————————————————————
 # Compensation Cess Engine
 
+# Upper bound on cached prefix resolutions per rule set.
+RESOLVE_CACHE_SIZE = 100_000
+
 class CompensationCessEngine:
     """
     Calculates Compensation Cess by HSN code using dynamic rules.
+
+    Rules come from the process-wide registry (see get_store) unless an
+    explicit rules dict or compiled CessRuleSet is passed in. An engine works
+    on the rule set in force today; pass as_of (or use for_date) to compute
+    with the rules in force on another date. version identifies the rule set
+    in use. HSNs without an exact rule fall back to
+    the most specific chapter/heading rule (see resolve_hsn).
     """
-    def __init__(self):
-        # Load rules from JSON
-        rules_path = os.path.join(os.path.dirname(__file__), "cess_rules.json")
-        try:
-            with open(rules_path) as f:
-                self.rules = json.load(f)
-            logger.info(f"Loaded {len(self.rules)} cess rules")
-        except Exception as e:
-            logger.exception(f"Failed to load cess rules: {e}")
-            self.rules = {}
+    def __init__(self, rules: Optional[dict] = None,
+                 ruleset: Optional[CessRuleSet] = None,
+                 store: Optional[RuleStore] = None):
+        if ruleset is None:
+            store = get_store() if rules is None else RuleStore(rules)
+            ruleset = store.current()
+        self.store = store
+        self.ruleset = ruleset
+        self.version = ruleset.version
+        self._table = ruleset.table
+        self._rule_index = ruleset.rule_index
+        self._prefix_lengths = ruleset.prefix_lengths
+        self._resolved = ruleset.resolved
+
+    @property
+    def rules(self) -> dict:
+        return self.ruleset.rules
 
-    @lru_cache(maxsize=1024)
     def _get_rule(self, hsn: str):
-        return self.rules.get(hsn)
+        # Plain lookups in (shared) dicts. Caching this per instance
+        # would pin every engine ever created; the dicts are already O(1).
+        key = self.resolve_hsn(hsn)
+        return None if key is None else self._table.to_rule(self._rule_index[key])
+
+    def resolve_hsn(self, hsn: str) -> Optional[str]:
+        """
+        Rule key that applies to hsn: the exact key if there is one, else
+        the longest all-digit key that is a prefix of hsn (e.g. "27011200"
+        resolves to the chapter head "2701"). None if nothing matches.
+        Results are cached per rule set, up to RESOLVE_CACHE_SIZE HSNs.
+        """
+        if hsn in self._rule_index:
+            return hsn
+        try:
+            return self._resolved[hsn]
+        except KeyError:
+            pass
+        key = None
+        if isinstance(hsn, str):
+            for length in self._prefix_lengths:
+                if length < len(hsn) and hsn[:length] in self._rule_index:
+                    key = hsn[:length]
+                    break
+        if len(self._resolved) >= RESOLVE_CACHE_SIZE:
+            self._resolved.clear()
+        self._resolved[hsn] = key
+        return key
+
+    def for_date(self, as_of) -> "CompensationCessEngine":
+        """Engine for the rules in force on as_of (a date or ISO string)."""
+        if as_of is None or self.store is None:
+            return self
+        return self.store.engine_at(_as_date(as_of))
+
+    def _period_buckets(self, as_of, n: int) -> list:
+        """
+        Split n lines by the rule-set period their as_of date falls in.
+        as_of is one date for all lines or a per-line sequence/array.
+        Returns [(engine, line_indices)].
+        """
+        if self.store is None or isinstance(as_of, (str, date)):
+            return [(self.for_date(as_of), np.arange(n))]
+        periods = self.store.period_indices(_date_ordinals(as_of))
+        return [(self.store.engine_for_period(p), np.flatnonzero(periods == p))
+                for p in np.unique(periods)]
+
+    def _get_row(self, hsn: str) -> Optional[int]:
+        """RuleTable row for hsn (exact, else by prefix), or None."""
+        row = self._rule_index.get(hsn)
+        if row is None:
+            key = self.resolve_hsn(hsn)
+            if key is not None:
+                row = self._rule_index[key]
+        return row
 
     def calculate_cess(self,
                        hsn: str,
                        transaction_value: Optional[float] = None,
                        quantity: Optional[float] = None,
-                       weight_tonnes: Optional[float] = None) -> float:
+                       weight_tonnes: Optional[float] = None,
+                       as_of=None) -> float:
+        if as_of is not None:
+            return self.for_date(as_of).calculate_cess(
+                hsn, transaction_value, quantity, weight_tonnes)
         try:
-            rule = self._get_rule(hsn)
-            if not rule:
+            row = self._get_row(hsn)
+            if row is None:
+                CESS_RULE_MISSES.inc()
                 logger.warning(f"Cess rule not found for HSN: {hsn}")
                 return 0.0
+            table = self._table
+            kind = table.kind[row]
+            CESS_EVALUATIONS.inc(_KIND_LABELS[kind])
+            return _FLOAT_KERNELS[kind](table, row, transaction_value,
+                                        quantity, weight_tonnes)
 
-            rtype = rule.get('type')
-            if rtype == 'ad_valorem':
-                return transaction_value * (rule['rate_percent'] / 100)
-            if rtype == 'fixed_per_unit':
-                return (quantity / rule['unit_count']) * rule['fixed_rate']
-            if rtype == 'per_weight':
-                return weight_tonnes * rule['rate_per_tonne']
-            if rtype == 'combined':
-                ad = transaction_value * (rule['rate_percent'] / 100)
-                pu = (quantity / rule['unit_count']) * rule['fixed_rate']
-                return ad + pu
-            if rtype == 'higher_of':
-                best = 0.0
-                for opt in rule['options']:
-                    # calculate each option individually
-                    sub_amt = CompensationCessEngine().calculate_cess(
-                        hsn,
-                        transaction_value=transaction_value,
-                        quantity=quantity,
-                        weight_tonnes=weight_tonnes
-                    )
-                    best = max(best, sub_amt)
-                return best
-
-            logger.error(f"Unknown rule type '{rtype}' for HSN {hsn}")
+        except Exception as e:
+            logger.exception(f"Error calculating cess for HSN {hsn}: {e}")
             return 0.0
 
+    def calculate_cess_batch(self,
+                             hsn,
+                             transaction_value=None,
+                             quantity=None,
+                             weight_tonnes=None,
+                             as_of=None) -> np.ndarray:
+        """
+        Vectorised calculate_cess over columnar inputs.
+
+        hsn is a sequence (or array) of HSN codes; the other arguments are float arrays
+        of the same length (NaN or None for missing values). Lines are grouped
+        by rule type and each group is evaluated with array arithmetic.
+        Unknown HSNs and lines missing a value their rule needs get 0.0,
+        matching the scalar method. as_of is one date or a per-line array of
+        dates; lines are bucketed by rule-set period and each bucket is
+        evaluated with that period's rules.
+        """
+        if isinstance(hsn, np.ndarray):
+            hsn = hsn.tolist()
+        n = len(hsn)
+        tv = _as_column(transaction_value, n)
+        qty = _as_column(quantity, n)
+        wt = _as_column(weight_tonnes, n)
+        out = np.zeros(n)
+        if n == 0:
+            return out
+        if as_of is not None:
+            for engine, sel in self._period_buckets(as_of, n):
+                out[sel] = engine.calculate_cess_batch(
+                    [hsn[i] for i in sel], tv[sel], qty[sel], wt[sel])
+            return out
+
+        self._evaluate_groups(self._rule_ids(hsn), (tv, qty, wt), out)
+        out[np.isnan(out)] = 0.0
+        return out
+
+    def calculate_cess_paise(self,
+                             hsn: str,
+                             value_paise: int,
+                             quantity_milli: Optional[int] = None,
+                             weight_grams: Optional[int] = None,
+                             as_of=None) -> int:
+        """
+        Fixed-point calculate_cess: value in integer paise, quantity in
+        thousandths of a unit, weight in grams (missing counts as zero).
+        Returns integer paise, each component rounded half away from zero.
+        """
+        if as_of is not None:
+            return self.for_date(as_of).calculate_cess_paise(
+                hsn, value_paise, quantity_milli, weight_grams)
+        try:
+            row = self._get_row(hsn)
+            if row is None:
+                CESS_RULE_MISSES.inc()
+                logger.warning(f"Cess rule not found for HSN: {hsn}")
+                return 0
+            table = self._table
+            kind = table.kind[row]
+            CESS_EVALUATIONS.inc(_KIND_LABELS[kind])
+            return _PAISE_KERNELS[kind](table, row, value_paise,
+                                        quantity_milli or 0, weight_grams or 0)
+
         except Exception as e:
             logger.exception(f"Error calculating cess for HSN {hsn}: {e}")
-            return 0.0
+            return 0
+
+    def calculate_cess_paise_batch(self,
+                                   hsn,
+                                   value_paise,
+                                   quantity_milli=None,
+                                   weight_grams=None,
+                                   as_of=None) -> np.ndarray:
+        """
+        Vectorised calculate_cess_paise over int64 columns (None → zeros).
+        Per-line amounts must stay below about 1.5e12 paise to avoid int64
+        overflow in the intermediate products. as_of as in
+        calculate_cess_batch.
+        """
+        if isinstance(hsn, np.ndarray):
+            hsn = hsn.tolist()
+        n = len(hsn)
+        cols = tuple(np.zeros(n, dtype=np.int64) if c is None
+                     else np.asarray(c, dtype=np.int64)
+                     for c in (value_paise, quantity_milli, weight_grams))
+        out = np.zeros(n, dtype=np.int64)
+        if n == 0:
+            return out
+        if as_of is not None:
+            for engine, sel in self._period_buckets(as_of, n):
+                out[sel] = engine.calculate_cess_paise_batch(
+                    [hsn[i] for i in sel], *(c[sel] for c in cols))
+            return out
+        self._evaluate_groups(self._rule_ids(hsn), cols, out, paise=True)
+        return out
+
+    def _rule_ids(self, hsn: list) -> np.ndarray:
+        """Map HSNs to RuleTable rows; -1 marks lines with no rule."""
+        rule_index = self._rule_index
+        rule_ids = np.fromiter(map(rule_index.get, hsn, repeat(-1)),
+                               dtype=np.intp, count=len(hsn))
+        unmatched = np.flatnonzero(rule_ids < 0)
+        if len(unmatched):
+            # Resolve each distinct non-exact HSN once by longest prefix.
+            resolved = {}
+            for i in unmatched:
+                h = hsn[i]
+                if h not in resolved:
+                    key = self.resolve_hsn(h)
+                    resolved[h] = -1 if key is None else rule_index[key]
+            rule_ids[unmatched] = [resolved[hsn[i]] for i in unmatched]
+            missing = sorted(str(h) for h, r in resolved.items() if r < 0)
+            if missing:
+                logger.warning(f"Cess rule not found for {len(missing)} HSN(s): "
+                               f"{', '.join(missing[:10])}")
+        return rule_ids
+
+    def _evaluate_groups(self, rule_ids: np.ndarray, cols: tuple,
+                         out: np.ndarray, paise: bool = False):
+        """Evaluate the lines that have a rule row into out (see _evaluate_rows)."""
+        lines = np.flatnonzero(rule_ids >= 0)
+        if len(lines) < len(rule_ids):
+            CESS_RULE_MISSES.inc(amount=len(rule_ids) - len(lines))
+        if len(lines):
+            rows = rule_ids[lines]
+            per_kind = np.bincount(self._table.np.kind[rows], minlength=len(_KIND_LABELS))
+            for kind in np.flatnonzero(per_kind):
+                CESS_EVALUATIONS.inc(_KIND_LABELS[kind], int(per_kind[kind]))
+            out[lines] = _evaluate_rows(self._table.np, rows,
+                                        [c[lines] for c in cols], paise)
 
 # —————————————————————————————————————————————————————
 # GST Engine
@@ -120,22 +1468,377 @@ class GSTEngine:
             logger.exception(f"Error calculating GST: {e}")
             return 0.0, 0.0, 0.0
 
+    def calculate_gst_paise(self,
+                            value_paise: int,
+                            rate_ppm: int,
+                            interstate: bool = False):
+        """
+        Fixed-point calculate_gst: value in integer paise, rate in parts per
+        million. Returns (CGST, SGST, IGST) in paise, rounded half away from
+        zero; CGST and SGST are each half the rate.
+        """
+        if interstate:
+            return 0, 0, _div_round(value_paise * rate_ppm, RATE_SCALE)
+        half = _div_round(value_paise * rate_ppm, 2 * RATE_SCALE)
+        return half, half, 0
+
+    def calculate_gst_paise_batch(self,
+                                  values_paise,
+                                  rates_ppm,
+                                  interstate_mask=None):
+        """
+        Vectorised calculate_gst_paise over int64 columns. Returns three
+        int64 arrays (CGST, SGST, IGST).
+        """
+        values = np.asarray(values_paise, dtype=np.int64)
+        rates = np.asarray(rates_ppm, dtype=np.int64)
+        if interstate_mask is None:
+            interstate = np.zeros(values.shape, dtype=bool)
+        else:
+            interstate = np.asarray(interstate_mask, dtype=bool)
+
+        product = values * rates
+        igst = np.where(interstate, _div_round(product, RATE_SCALE), 0)
+        cgst = np.where(interstate, 0, _div_round(product, 2 * RATE_SCALE))
+        return cgst, cgst.copy(), igst
+
+    def calculate_gst_batch(self,
+                            values,
+                            rates,
+                            interstate_mask=None):
+        """
+        Vectorised calculate_gst followed by currency rounding.
+
+        values and rates are float arrays (rates may be a scalar);
+        interstate_mask is a bool array, None meaning all intrastate.
+        Returns three float64 arrays (CGST, SGST, IGST), each equal line by
+        line to round_amount applied to calculate_gst.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        rates = np.asarray(rates, dtype=np.float64)
+        if interstate_mask is None:
+            interstate = np.zeros(values.shape, dtype=bool)
+        else:
+            interstate = np.asarray(interstate_mask, dtype=bool)
+
+        igst = np.where(interstate, values * (rates / 100), 0.0)
+        cgst = np.where(interstate, 0.0, values * ((rates / 2) / 100))
+        cgst = round_amount_batch(cgst)
+        return cgst, cgst.copy(), round_amount_batch(igst)
+
+# —————————————————————————————————————————————————————
+# Shared Rule Registry
+
+# A cess_rules.json-style file, or a compiled bundle ending in .cessb.
+RULES_PATH = (os.environ.get("TAX_ENGINE_RULES")
+              or os.path.join(os.path.dirname(__file__), "cess_rules.json"))
+
+_registry_lock = threading.RLock()
+_shared_store: Optional[RuleStore] = None
+_shared_engine: Optional[CompensationCessEngine] = None
+# When the shared engine's rule-set period ends (next effective_from date).
+_engine_expires_at = float('inf')
+# (inode, mtime_ns, size) of the rules file behind _shared_store.
+_rules_signature: Optional[tuple] = None
+
+def _read_rules(path: str) -> dict:
+    """Read and parse a cess rules file; raises on any failure."""
+    with open(path) as f:
+        rules = json.load(f)
+    if not isinstance(rules, dict):
+        raise ValueError("cess rules file must contain a JSON object")
+    return rules
+
+def _load_rules(path: str = RULES_PATH) -> dict:
+    """Read and parse the cess rules file. Returns {} on failure."""
+    try:
+        rules = _read_rules(path)
+        logger.info(f"Loaded {len(rules)} cess rules")
+        return rules
+    except Exception as e:
+        logger.exception(f"Failed to load cess rules: {e}")
+        return {}
+
+def _file_signature(path: str) -> Optional[tuple]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def _record_load(started: float):
+    RULESET_LOADS.inc()
+    RULESET_LOAD_SECONDS.set(time.perf_counter() - started)
+
+def get_store() -> RuleStore:
+    """
+    Process-wide effective-dated rule store, loaded from RULES_PATH on first
+    use. Thread-safe; the file is read once per process unless reloaded.
+    """
+    global _shared_store, _rules_signature
+    if _shared_store is None:
+        with _registry_lock:
+            if _shared_store is None:
+                signature = _file_signature(RULES_PATH)
+                started = time.perf_counter()
+                try:
+                    if _is_bundle(RULES_PATH):
+                        store = load_rule_bundle(RULES_PATH)
+                    else:
+                        store = RuleStore(_load_rules(RULES_PATH))
+                except Exception as e:
+                    logger.exception(f"Invalid cess rules file: {e}")
+                    store = RuleStore({})
+                _record_load(started)
+                _shared_store = store
+                _rules_signature = signature
+    return _shared_store
+
+def get_ruleset() -> CessRuleSet:
+    """Process-wide compiled rule set in force today."""
+    return get_store().current()
+
+def get_rules() -> dict:
+    """Process-wide cess rules in force today (HSN → rule)."""
+    return get_ruleset().rules
+
+def get_compiled_rules() -> dict:
+    """Process-wide {hsn: evaluator} mapping in force today."""
+    return get_ruleset().evaluators
+
+def get_engine() -> CompensationCessEngine:
+    """
+    Shared CompensationCessEngine for library callers and WSGI workers,
+    bound to today's rule set and replaced when a dated change takes effect.
+    """
+    global _shared_engine, _engine_expires_at
+    engine = _shared_engine
+    if engine is None or time.time() >= _engine_expires_at:
+        store = get_store()
+        with _registry_lock:
+            if _shared_engine is None or time.time() >= _engine_expires_at:
+                today = date.today()
+                _shared_engine = store.engine_at(today)
+                _engine_expires_at = store.expiry(today)
+            engine = _shared_engine
+    return engine
+
+def reload_rules(path: Optional[str] = None, force: bool = False) -> bool:
+    """
+    Reload the rules file if its inode, mtime or size changed (or always,
+    with force). The new rule store is compiled on the calling thread and
+    then published with a single reference swap: calculations already
+    holding the old engine finish on it, later ones get the new one. On any
+    error the current rules stay in place. Returns True if new rules were
+    published.
+    """
+    global _shared_store, _shared_engine, _engine_expires_at, _rules_signature
+    path = path or RULES_PATH
+    with _registry_lock:
+        signature = _file_signature(path)
+        if not force and _shared_store is not None and signature == _rules_signature:
+            return False
+        started = time.perf_counter()
+        try:
+            store = (load_rule_bundle(path) if _is_bundle(path)
+                     else RuleStore(_read_rules(path)))
+        except Exception as e:
+            logger.exception(f"Cess rules reload failed, keeping current rules: {e}")
+            return False
+        _record_load(started)
+        today = date.today()
+        engine = store.engine_at(today)
+        _shared_store = store
+        _engine_expires_at = store.expiry(today)
+        _shared_engine = engine
+        _rules_signature = signature
+    logger.info(f"Reloaded {len(store.current())} cess rules, "
+                f"version {engine.version}")
+    return True
+
+class RulesWatcher(threading.Thread):
+    """
+    Daemon thread that calls reload_rules() every `interval` seconds.
+    """
+    def __init__(self, interval: float = 5.0, path: Optional[str] = None):
+        super().__init__(name="TaxEngineRulesWatcher", daemon=True)
+        self.interval = interval
+        self.path = path
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            reload_rules(self.path)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+def start_rules_watcher(interval: float = 5.0, path: Optional[str] = None) -> RulesWatcher:
+    """Start polling the rules file for changes; returns the watcher thread."""
+    watcher = RulesWatcher(interval, path)
+    watcher.start()
+    return watcher
+
+# —————————————————————————————————————————————————————
+# Audit Logging
+#
+# One structured record per computed line on the "TaxEngine.audit" logger.
+# Formatting is deferred until a handler actually emits the record, and
+# sampling keeps volume down: 'full' logs every line, 'sampled' logs one
+# line in sample_every plus every line whose TotalTax >= threshold, 'off'
+# logs nothing.
+
+audit_logger = logger.getChild("audit")
+
+AUDIT_MODES = ('off', 'sampled', 'full')
+AUDIT_FIELDS = ('HSN', 'Category', 'AssessableValue', 'Quantity', 'WeightTonnes',
+                'CGST', 'SGST', 'IGST', 'CompensationCess', 'TotalTax',
+                'RuleSetVersion')
+
+_audit_mode = 'full'
+_audit_sample_every = 100
+_audit_threshold: Optional[float] = None
+_audit_counter = count()
+
+class _AuditRecord:
+    """Snapshot of a result, rendered as compact JSON only when emitted."""
+    __slots__ = ("values",)
+
+    def __init__(self, result: dict):
+        self.values = tuple(result.values())
+
+    def __str__(self):
+        return json.dumps(dict(zip(AUDIT_FIELDS, self.values)),
+                          separators=(',', ':'))
+
+def configure_audit(mode: str = 'full', sample_every: int = 100,
+                    threshold: Optional[float] = None):
+    """Set the audit mode ('off', 'sampled' or 'full') and sampling policy."""
+    global _audit_mode, _audit_sample_every, _audit_threshold, _audit_counter
+    if mode not in AUDIT_MODES:
+        raise ValueError(f"Unknown audit mode '{mode}'")
+    if sample_every < 1:
+        raise ValueError("sample_every must be >= 1")
+    _audit_mode = mode
+    _audit_sample_every = sample_every
+    _audit_threshold = threshold
+    _audit_counter = count()
+
+def audit_line(result: dict):
+    """Emit the audit record for one result, subject to mode and sampling."""
+    if _audit_mode == 'off' or not audit_logger.isEnabledFor(logging.INFO):
+        return
+    if _audit_mode == 'sampled' and next(_audit_counter) % _audit_sample_every:
+        if _audit_threshold is None or result['TotalTax'] < _audit_threshold:
+            return
+    audit_logger.info("Tax calc: %s", _AuditRecord(result))
+
+# —————————————————————————————————————————————————————
+# Stage Timing
+#
+# calculate_taxes_for_line and calculate_taxes_for_lines can time their
+# stages (parse, currency, gst, cess, rounding, audit) with perf_counter_ns
+# and hand the timings to a sink: sink.record(path, timings, lines), where
+# path is 'line' or 'lines', timings maps stage → nanoseconds and lines is
+# the number of lines covered. The sink is the one passed in, else the one
+# installed with set_stage_sink() (or TAX_ENGINE_STAGE_LOG=path). With no
+# sink the only cost is an `is not None` test at each stage boundary.
+
+# Request header asking /api/taxes and /api/taxes/batch to return timings.
+DEBUG_TIMINGS_HEADER = "X-Tax-Debug-Timings"
+
+class StageStats:
+    """In-memory sink: count, total and max nanoseconds per (path, stage)."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, path: str, timings: dict, lines: int = 1):
+        with self._lock:
+            for stage, ns in timings.items():
+                stat = self._stats.get((path, stage))
+                if stat is None:
+                    stat = self._stats[(path, stage)] = [0, 0, 0, 0]
+                stat[0] += 1
+                stat[1] += lines
+                stat[2] += ns
+                if ns > stat[3]:
+                    stat[3] = ns
+
+    def snapshot(self) -> dict:
+        """{path: {stage: {calls, lines, total_ns, max_ns, ns_per_line}}}."""
+        with self._lock:
+            items = [(key, list(stat)) for key, stat in self._stats.items()]
+        out = {}
+        for (path, stage), (calls, lines, total, peak) in items:
+            out.setdefault(path, {})[stage] = {
+                'calls': calls, 'lines': lines, 'total_ns': total, 'max_ns': peak,
+                'ns_per_line': total / lines if lines else 0.0}
+        return out
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+class StageFileSink:
+    """Appends one JSON object per record to a file."""
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, path: str, timings: dict, lines: int = 1):
+        entry = json.dumps({'path': path, 'lines': lines, 'timings_ns': timings},
+                           separators=(',', ':'))
+        with self._lock:
+            self._file.write(entry + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class _StageCapture:
+    """Sums the timings of one request (for a debug response) and forwards them."""
+    def __init__(self, forward=None):
+        self.forward = forward
+        self.timings = {}
+
+    def record(self, path: str, timings: dict, lines: int = 1):
+        for stage, ns in timings.items():
+            self.timings[stage] = self.timings.get(stage, 0) + ns
+        if self.forward is not None:
+            self.forward.record(path, timings, lines)
+
+_stage_sink = None
+
+def set_stage_sink(sink):
+    """Install the process-wide stage timing sink (None disables timing)."""
+    global _stage_sink
+    _stage_sink = sink
+
+def get_stage_sink():
+    return _stage_sink
+
+def _lap(timings: dict, stage: str, started: int) -> int:
+    """Record now - started under stage; return now."""
+    now = time.perf_counter_ns()
+    timings[stage] = now - started
+    return now
+
+if os.environ.get("TAX_ENGINE_STAGE_LOG"):
+    set_stage_sink(StageFileSink(os.environ["TAX_ENGINE_STAGE_LOG"]))
+
 # —————————————————————————————————————————————————————
 # Main Entry Point
 
-def calculate_taxes_for_line(form_data: dict) -> dict:
+def _parse_fields(form_data: dict) -> tuple:
     """
-    form_data must include:
-      - hsn: str
-      - base_price: float (assessable value)
-      - qty_uom: float
-      - weight_grams: Optional[float]
-      - gst_rate: float
-      - interstate: bool
-      - currency: str (e.g. 'INR','USD')
-      - category: str (e.g. 'Default' or 'Custom')
+    Extract one line's fields and convert grams → tonnes. Returns (hsn,
+    category, assessable_value, quantity, weight_tonnes, gst_rate,
+    interstate, currency), with assessable_value still in currency.
     """
-    # Extract & preprocess
     hsn             = form_data['hsn']
     category        = form_data.get('category', 'Default')
     assessable_value= float(form_data['base_price'])
@@ -144,36 +1847,100 @@ def calculate_taxes_for_line(form_data: dict) -> dict:
     gst_rate        = float(form_data.get('gst_rate', 0))
     interstate      = bool(form_data.get('interstate', False))
     currency        = form_data.get('currency', 'INR')
-
-    # Currency conversion
-    if currency != 'INR':
-        assessable_value = convert_to_inr(assessable_value, currency)
+    if not isinstance(currency, str):
+        raise TypeError(f"currency must be a string, got {type(currency).__name__}")
 
     # Unit conversion: grams → tonnes
     weight_tonnes = None
     if weight_grams is not None:
         weight_tonnes = float(weight_grams) / 1_000_000
 
+    return (hsn, category, assessable_value, quantity,
+            weight_tonnes, gst_rate, interstate, currency)
+
+def _parse_line(form_data: dict, as_of=None) -> tuple:
+    """
+    _parse_fields plus currency conversion to INR at the rate on as_of
+    (default form_data['as_of'], else today). Returns (hsn, category,
+    assessable_value, quantity, weight_tonnes, gst_rate, interstate).
+    """
+    *fields, currency = _parse_fields(form_data)
+    if currency != 'INR':
+        if as_of is None:
+            as_of = form_data.get('as_of')
+        fields[2] = convert_to_inr(fields[2], currency, as_of)
+    return tuple(fields)
+
+def _line_engine(engine: Optional[CompensationCessEngine], form_data: dict,
+                 as_of=None) -> CompensationCessEngine:
+    """The engine for a line: shared by default, dated if the line asks."""
+    engine = engine or get_engine()
+    if as_of is None:
+        as_of = form_data.get('as_of')
+    return engine if as_of is None else engine.for_date(as_of)
+
+def calculate_taxes_for_line(form_data: dict,
+                             engine: Optional[CompensationCessEngine] = None,
+                             as_of=None, sink=None) -> dict:
+    """
+    form_data must include:
+      - hsn: str
+      - base_price: float (assessable value)
+      - qty_uom: float
+      - weight_grams: Optional[float]
+      - gst_rate: float
+      - interstate: bool
+      - currency: str (e.g. 'INR','USD')
+      - category: str (e.g. 'Default' or 'Custom')
+      - as_of: Optional[str] (ISO date; cess rules in force on that date)
+
+    engine defaults to the shared engine from get_engine(). The as_of
+    argument overrides form_data['as_of']. The result's RuleSetVersion names
+    the cess rule set the line was computed with. sink receives per-stage
+    timings (see Stage Timing); it defaults to the installed stage sink.
+    """
+    sink = sink or _stage_sink
+    if sink is not None:
+        timings = {}
+        lap = time.perf_counter_ns()
+    engine = _line_engine(engine, form_data, as_of)
+    hsn, category, assessable_value, quantity, weight_tonnes, gst_rate, \
+        interstate, currency = _parse_fields(form_data)
+    if sink is not None:
+        lap = _lap(timings, 'parse', lap)
+
+    # Currency conversion
+    if currency != 'INR':
+        assessable_value = convert_to_inr(
+            assessable_value, currency, form_data.get('as_of') if as_of is None else as_of)
+    if sink is not None:
+        lap = _lap(timings, 'currency', lap)
+
     # Compute GST
     cgst, sgst, igst = GSTEngine().calculate_gst(
         assessable_value, gst_rate, interstate
     )
-    cgst, sgst, igst = map(round_amount, (cgst, sgst, igst))
+    if sink is not None:
+        lap = _lap(timings, 'gst', lap)
 
     # Compute Compensation Cess
     cess = 0.0
     if category != 'Custom':
-        cess = CompensationCessEngine().calculate_cess(
+        cess = engine.calculate_cess(
             hsn,
             transaction_value=assessable_value,
             quantity=quantity,
             weight_tonnes=weight_tonnes
         )
-        cess = round_amount(cess)
     else:
-        logger.info(f"Custom category for HSN {hsn}: skipping auto-cess")
+        logger.info("Custom category for HSN %s: skipping auto-cess", hsn)
+    if sink is not None:
+        lap = _lap(timings, 'cess', lap)
 
+    cgst, sgst, igst, cess = map(round_amount, (cgst, sgst, igst, cess))
     total_tax = round_amount(cgst + sgst + igst + cess)
+    if sink is not None:
+        lap = _lap(timings, 'rounding', lap)
 
     result = {
         'HSN': hsn,
@@ -185,21 +1952,457 @@ def calculate_taxes_for_line(form_data: dict) -> dict:
         'SGST': sgst,
         'IGST': igst,
         'CompensationCess': cess,
-        'TotalTax': total_tax
+        'TotalTax': total_tax,
+        'RuleSetVersion': engine.version
+    }
+    audit_line(result)
+    if sink is not None:
+        _lap(timings, 'audit', lap)
+        sink.record('line', timings)
+    return result
+
+def calculate_taxes_for_line_paise(form_data: dict,
+                                   engine: Optional[CompensationCessEngine] = None,
+                                   as_of=None) -> dict:
+    """
+    Fixed-point calculate_taxes_for_line. Takes the same form_data; the
+    amount fields of the result (AssessableValue, CGST, SGST, IGST,
+    CompensationCess, TotalTax) are integer paise, computed with integer
+    arithmetic and half-away-from-zero rounding, so TotalTax is exactly the
+    sum of its parts and lines can be summed without drift.
+    """
+    engine = _line_engine(engine, form_data, as_of)
+    hsn, category, assessable_value, quantity, weight_tonnes, gst_rate, \
+        interstate = _parse_line(form_data, as_of)
+    value_paise = to_paise(assessable_value)
+
+    cgst, sgst, igst = GSTEngine().calculate_gst_paise(
+        value_paise, rate_to_ppm(gst_rate), interstate
+    )
+
+    cess = 0
+    if category != 'Custom':
+        weight_grams = None if weight_tonnes is None else int(round(weight_tonnes * 1_000_000))
+        cess = engine.calculate_cess_paise(
+            hsn, value_paise, int(round(quantity * QTY_SCALE)), weight_grams
+        )
+    else:
+        logger.info("Custom category for HSN %s: skipping auto-cess", hsn)
+
+    result = {
+        'HSN': hsn,
+        'Category': category,
+        'AssessableValue': value_paise,
+        'Quantity': quantity,
+        'WeightTonnes': weight_tonnes,
+        'CGST': cgst,
+        'SGST': sgst,
+        'IGST': igst,
+        'CompensationCess': cess,
+        'TotalTax': cgst + sgst + igst + cess,
+        'RuleSetVersion': engine.version
     }
-    logger.info(f"Tax calc: {result}")
+    audit_line(result)
     return result
 
+# Batches at least this large go through the vectorised GST/cess path.
+BATCH_VECTORISE_THRESHOLD = 32
+
+def _line_error(index: int, exc: Exception) -> dict:
+    if isinstance(exc, KeyError):
+        message = f"Missing parameter: {exc}"
+    else:
+        message = str(exc)
+    logger.error(f"Invalid line {index}: {message}")
+    return {'index': index, 'error': message}
+
+def calculate_taxes_for_lines(lines: list,
+                              engine: Optional[CompensationCessEngine] = None,
+                              sink=None) -> list:
+    """
+    Calculate taxes for many lines in the calculate_taxes_for_line shape.
+
+    Returns one entry per input line, in order: the line's result dict, or
+    {'index': i, 'error': message} if the line is invalid. Batches of
+    BATCH_VECTORISE_THRESHOLD lines or more use the vectorised engines;
+    results are identical either way. sink receives stage timings: per line
+    ('line') below the threshold, per batch ('lines') above it, where gst
+    and cess include their own rounding and results covers building the
+    result dicts and auditing them.
+    """
+    engine = engine or get_engine()
+    sink = sink or _stage_sink
+    if len(lines) < BATCH_VECTORISE_THRESHOLD:
+        results = []
+        for i, line in enumerate(lines):
+            try:
+                results.append(calculate_taxes_for_line(line, engine=engine, sink=sink))
+            except (KeyError, ValueError, TypeError, AttributeError) as e:
+                results.append(_line_error(i, e))
+        return results
+
+    if sink is not None:
+        timings = {}
+        lap = time.perf_counter_ns()
+    results = [None] * len(lines)
+    parsed = []
+    positions = []
+    engines = []
+    for i, line in enumerate(lines):
+        try:
+            parsed.append(_parse_fields(line))
+            engines.append(_line_engine(engine, line))
+            positions.append(i)
+        except (KeyError, ValueError, TypeError, AttributeError) as e:
+            del parsed[len(positions):]
+            results[i] = _line_error(i, e)
+    if not parsed:
+        return results
+
+    (hsn, category, value, quantity, weight_tonnes, gst_rate, interstate,
+     currency) = zip(*parsed)
+    values = np.array(value, dtype=np.float64)
+    if sink is not None:
+        lap = _lap(timings, 'parse', lap)
+    if any(c != 'INR' for c in currency):
+        as_of = [lines[i].get('as_of') for i in positions]
+        convert_to_inr_batch(values, currency,
+                             None if all(d is None for d in as_of) else as_of)
+        value = values.tolist()
+    if sink is not None:
+        lap = _lap(timings, 'currency', lap)
+    cgst, sgst, igst = GSTEngine().calculate_gst_batch(
+        values, np.array(gst_rate, dtype=np.float64), np.array(interstate, dtype=bool)
+    )
+    if sink is not None:
+        lap = _lap(timings, 'gst', lap)
+
+    custom = np.array([c == 'Custom' for c in category], dtype=bool)
+    cess = np.zeros(len(parsed))
+    auto = np.flatnonzero(~custom)
+    if len(auto):
+        wt = np.array([np.nan if w is None else w for w in weight_tonnes],
+                      dtype=np.float64)
+        # Non-string HSNs never match a rule key (the scalar path gives them
+        # 0.0 too); mapping them to '' keeps unhashable values out of the lookup.
+        quantities = np.array(quantity, dtype=np.float64)
+        # Bucket lines by the (dated) engine they use.
+        buckets = {}
+        for j in auto:
+            buckets.setdefault(engines[j], []).append(j)
+        for line_engine, sel in buckets.items():
+            sel = np.array(sel)
+            keys = [hsn[j] if isinstance(hsn[j], str) else '' for j in sel]
+            cess[sel] = round_amount_batch(line_engine.calculate_cess_batch(
+                keys, values[sel], quantities[sel], wt[sel]
+            ))
+    for j in np.flatnonzero(custom):
+        logger.info("Custom category for HSN %s: skipping auto-cess", hsn[j])
+    if sink is not None:
+        lap = _lap(timings, 'cess', lap)
+    total = round_amount_batch(cgst + sgst + igst + cess)
+    if sink is not None:
+        lap = _lap(timings, 'rounding', lap)
+
+    columns = zip(positions, hsn, category, value, quantity, weight_tonnes,
+                  cgst.tolist(), sgst.tolist(), igst.tolist(),
+                  cess.tolist(), total.tolist(), engines)
+    for i, h, cat, v, q, wt, cg, sg, ig, cs, tot, line_engine in columns:
+        result = {
+            'HSN': h,
+            'Category': cat,
+            'AssessableValue': v,
+            'Quantity': q,
+            'WeightTonnes': wt,
+            'CGST': cg,
+            'SGST': sg,
+            'IGST': ig,
+            'CompensationCess': cs,
+            'TotalTax': tot,
+            'RuleSetVersion': line_engine.version
+        }
+        audit_line(result)
+        results[i] = result
+    if sink is not None:
+        _lap(timings, 'results', lap)
+        sink.record('lines', timings, len(parsed))
+    return results
+
+# Header fields an invoice passes down to lines that do not set them.
+INVOICE_HEADER_FIELDS = ('currency', 'interstate', 'category', 'as_of')
+# Money columns summed into invoice totals and HSN subtotals.
+INVOICE_AMOUNT_FIELDS = ('AssessableValue', 'CGST', 'SGST', 'IGST',
+                         'CompensationCess', 'TotalTax')
+
+def _sum_paise(results: list) -> dict:
+    """Exact sums of the money columns over results, in integer paise."""
+    sums = dict.fromkeys(INVOICE_AMOUNT_FIELDS, 0)
+    for result in results:
+        for field in INVOICE_AMOUNT_FIELDS:
+            sums[field] += to_paise(result[field])
+    return sums
+
+def _paise_totals(sums: dict, lines: int) -> dict:
+    totals = {field: paise / PAISE_PER_RUPEE for field, paise in sums.items()}
+    totals['Lines'] = lines
+    return totals
+
+def calculate_taxes_for_invoice(invoice: dict,
+                                engine: Optional[CompensationCessEngine] = None) -> dict:
+    """
+    Calculate taxes for a whole invoice in one pass.
+
+    invoice holds a header (currency, interstate, category, as_of; each a
+    default for lines that do not set it) and 'lines', a list of line
+    dicts as for calculate_taxes_for_line. All lines are evaluated together
+    by calculate_taxes_for_lines against one engine. Returns:
+      - lines: the per-line results (or {'index', 'error'} entries)
+      - totals: AssessableValue, CGST, SGST, IGST, CompensationCess and
+        TotalTax summed over the valid lines, plus Lines (their count)
+      - hsn_subtotals: the same sums per HSN, in first-seen order
+      - errors: the number of invalid lines
+    Each line's AssessableValue is rounded to paise (it is unrounded after
+    FX conversion), and sums are accumulated exactly in integer paise from
+    the rounded per-line amounts, so they always equal the sum of the lines
+    shown.
+    Raises ValueError if 'lines' is missing or not a list.
+    """
+    lines = invoice.get('lines')
+    if not isinstance(lines, list):
+        raise ValueError("invoice must have a list of lines")
+    header = {f: invoice[f] for f in INVOICE_HEADER_FIELDS if f in invoice}
+    if header:
+        lines = [{**header, **line} if isinstance(line, dict) else line
+                 for line in lines]
+
+    results = calculate_taxes_for_lines(lines, engine=engine or get_engine())
+    valid = [r for r in results if 'error' not in r]
+    by_hsn = {}
+    for result in valid:
+        result['AssessableValue'] = round_amount(result['AssessableValue'])
+        by_hsn.setdefault(str(result['HSN']), []).append(result)
+    return {
+        'lines': results,
+        'totals': _paise_totals(_sum_paise(valid), len(valid)),
+        'hsn_subtotals': {hsn: _paise_totals(_sum_paise(group), len(group))
+                          for hsn, group in by_hsn.items()},
+        'errors': len(results) - len(valid),
+    }
+
+# Lines per task sent to a bulk worker: large enough that pickling a chunk
+# and its results costs little next to evaluating it.
+BULK_CHUNK_LINES = 5000
+
+# The engine of a bulk worker process, set once by _init_bulk_worker.
+_bulk_engine: Optional[CompensationCessEngine] = None
+
+def _init_bulk_worker(store: RuleStore):
+    global _bulk_engine
+    _reset_worker_logging()
+    _bulk_engine = CompensationCessEngine(ruleset=store.current(), store=store)
+
+def _bulk_chunk(task: tuple) -> list:
+    start, lines = task
+    results = calculate_taxes_for_lines(lines, engine=_bulk_engine)
+    for result in results:
+        if 'error' in result:
+            result['index'] += start
+    return results
+
+class BulkEvaluator:
+    """
+    Evaluates large batches of lines across a pool of worker processes.
+
+    Each worker receives the compiled RuleStore once, when it starts, and
+    keeps its own engine on it; tasks carry only lines and results. Lines
+    are sent in chunks of chunk_size and evaluated with
+    calculate_taxes_for_lines, and results come back in input order with
+    error indices relative to the whole batch. Workers use their own FX
+    provider and audit settings (inherited under fork, defaults under
+    spawn) and always log synchronously. Use as a context manager, or
+    call close().
+    """
+    def __init__(self, workers: Optional[int] = None,
+                 chunk_size: int = BULK_CHUNK_LINES,
+                 store: Optional[RuleStore] = None,
+                 mp_context=None):
+        self.store = store or get_store()
+        self.chunk_size = chunk_size
+        self._pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                                         initializer=_init_bulk_worker,
+                                         initargs=(self.store,))
+
+    def evaluate(self, lines: list) -> list:
+        """calculate_taxes_for_lines(lines), sharded across the workers."""
+        size = self.chunk_size
+        tasks = ((start, lines[start:start + size])
+                 for start in range(0, len(lines), size))
+        results = []
+        for chunk in self._pool.map(_bulk_chunk, tasks):
+            results.extend(chunk)
+        return results
+
+    def close(self):
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# —————————————————————————————————————————————————————
+# Result Cache
+#
+# Optional memoisation in front of calculate_taxes_for_line for repeated
+# identical quotes. Entries are keyed on the parsed line (so "100" and 100.0
+# share an entry), its as_of, the rule-set version it resolves to and, for
+# foreign-currency lines, the FX rate in force for the line's date (today
+# when it has no as_of): a rule reload, an FX refresh with a new rate or a
+# dated rate taking effect at midnight changes the key, so stale entries are
+# never served and simply age out. Hits are still audited.
+
+RESULT_CACHE_HITS = Counter("tax_engine_result_cache_hits", "Result cache hits.")
+RESULT_CACHE_MISSES = Counter("tax_engine_result_cache_misses", "Result cache misses.")
+RESULT_CACHE_EVICTIONS = Counter("tax_engine_result_cache_evictions",
+                                 "Result cache entries evicted or expired.")
+
+class ResultCache:
+    """
+    Thread-safe bounded LRU cache of line results, with an optional TTL in
+    seconds (None: entries live until evicted). Use calculate() in place
+    of calculate_taxes_for_line.
+    """
+    def __init__(self, maxsize: int = 10_000, ttl: Optional[float] = 300.0):
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = self._misses = self._evictions = self._expirations = 0
+
+    def _key(self, form_data: dict, engine: CompensationCessEngine, as_of) -> tuple:
+        fields = _parse_fields(form_data)
+        if as_of is None:
+            as_of = form_data.get('as_of')
+        rate = None
+        if fields[-1] != 'INR':
+            rate = get_fx_provider().rate(fields[-1], as_of)
+        return fields + (as_of, engine.version, rate)
+
+    def calculate(self, form_data: dict,
+                  engine: Optional[CompensationCessEngine] = None,
+                  as_of=None, sink=None) -> dict:
+        """calculate_taxes_for_line, answered from the cache when possible."""
+        line_engine = _line_engine(engine, form_data, as_of)
+        key = self._key(form_data, line_engine, as_of)
+        try:
+            hash(key)
+        except TypeError:
+            # Unhashable field values (e.g. a list as hsn): compute directly.
+            return calculate_taxes_for_line(form_data, engine, as_of, sink)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    result = dict(entry[1])
+                else:
+                    del self._entries[key]
+                    self._expirations += 1
+                    entry = None
+            if entry is None:
+                self._misses += 1
+        if entry is not None:
+            RESULT_CACHE_HITS.inc()
+            audit_line(result)
+            return result
+
+        RESULT_CACHE_MISSES.inc()
+        result = calculate_taxes_for_line(form_data, engine, as_of, sink)
+        expires = now + self.ttl if self.ttl is not None else float('inf')
+        evicted = 0
+        with self._lock:
+            self._entries[key] = (expires, dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+                evicted += 1
+        if evicted:
+            RESULT_CACHE_EVICTIONS.inc(amount=evicted)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """{hits, misses, evictions, expirations, size, maxsize, hit_rate}."""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {'hits': self._hits, 'misses': self._misses,
+                    'evictions': self._evictions, 'expirations': self._expirations,
+                    'size': len(self._entries), 'maxsize': self.maxsize,
+                    'hit_rate': self._hits / lookups if lookups else 0.0}
+
+_result_cache: Optional[ResultCache] = None
+
+def set_result_cache(cache: Optional[ResultCache]):
+    """Install the cache used by /api/taxes (None disables caching)."""
+    global _result_cache
+    _result_cache = cache
+
+def get_result_cache() -> Optional[ResultCache]:
+    return _result_cache
+
+if os.environ.get("TAX_ENGINE_RESULT_CACHE"):
+    set_result_cache(ResultCache(int(os.environ["TAX_ENGINE_RESULT_CACHE"])))
+
 # —————————————————————————————————————————————————————
 # Flask API Endpoint
 
 app = Flask(__name__)
 
+def _instrumented(view):
+    """Time a view and count its responses by HTTP status (see Metrics)."""
+    endpoint = (view.__name__,)
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = view(*args, **kwargs)
+            status = response[1] if isinstance(response, tuple) else response.status_code
+            return response
+        finally:
+            REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint)
+            REQUESTS.inc(endpoint + (str(status),))
+    return wrapper
+
+def _debug_capture() -> Optional[_StageCapture]:
+    """A capturing sink if the request carries DEBUG_TIMINGS_HEADER, else None."""
+    if request.headers.get(DEBUG_TIMINGS_HEADER, '').lower() in ('', '0', 'false'):
+        return None
+    return _StageCapture(forward=_stage_sink)
+
 @app.route("/api/taxes", methods=["GET", "POST"])
+@_instrumented
 def api_taxes():
     try:
         data = request.json if request.method == "POST" else request.args.to_dict()
-        result = calculate_taxes_for_line(data)
+        capture = _debug_capture()
+        cache = _result_cache
+        if cache is not None:
+            result = cache.calculate(data, engine=get_engine(), sink=capture)
+        else:
+            result = calculate_taxes_for_line(data, engine=get_engine(), sink=capture)
+        if capture is not None:
+            result = dict(result, StageTimingsNs=capture.timings)
         return jsonify(result)
     except KeyError as ke:
         logger.error(f"Missing parameter: {ke}")
@@ -211,7 +2414,334 @@ def api_taxes():
         logger.exception("Tax API internal error")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route("/api/taxes/batch", methods=["POST"])
+@_instrumented
+def api_taxes_batch():
+    """
+    Body: a JSON array of line objects, or {"lines": [...]}.
+    Returns {"results": [...], "errors": n}; each entry is the line's result
+    or {"index": i, "error": message}, so one bad line does not fail the rest.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            data = data.get('lines')
+        if not isinstance(data, list):
+            return jsonify({"error": "Expected a JSON array of lines"}), 400
+        capture = _debug_capture()
+        results = calculate_taxes_for_lines(data, engine=get_engine(), sink=capture)
+        errors = sum(1 for r in results if 'error' in r)
+        body = {"results": results, "errors": errors}
+        if capture is not None:
+            body["StageTimingsNs"] = capture.timings
+        return jsonify(body)
+    except Exception:
+        logger.exception("Tax batch API internal error")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route("/api/taxes/invoice", methods=["POST"])
+@_instrumented
+def api_taxes_invoice():
+    """
+    Body: {"currency", "interstate", "category", "as_of" (all optional),
+    "lines": [...]}. Returns calculate_taxes_for_invoice's result.
+    """
+    try:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({"error": "Expected a JSON invoice object"}), 400
+        return jsonify(calculate_taxes_for_invoice(data, engine=get_engine()))
+    except ValueError as ve:
+        logger.error(f"Invalid invoice: {ve}")
+        return jsonify({"error": str(ve)}), 400
+    except Exception:
+        logger.exception("Tax invoice API internal error")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """In-process metrics in the Prometheus text exposition format."""
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+# The admin API is only registered when TAX_ENGINE_ADMIN_TOKEN is set, and
+# callers must send it as "Authorization: Bearer <token>". Without it,
+# reload_rules() and the RulesWatcher are the only reload triggers.
+ADMIN_TOKEN = os.environ.get("TAX_ENGINE_ADMIN_TOKEN")
+
+def _admin_authorized() -> bool:
+    header = request.headers.get("Authorization", "")
+    scheme, _, token = header.partition(" ")
+    return (bool(ADMIN_TOKEN) and scheme.lower() == "bearer"
+            and hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()))
+
+@_instrumented
+def api_reload_rules():
+    """Reload cess_rules.json now (regardless of mtime) and report the version."""
+    if not _admin_authorized():
+        return jsonify({"error": "Unauthorized"}), 401
+    reloaded = reload_rules(force=True)
+    status = 200 if reloaded else 500
+    return jsonify({"reloaded": reloaded, "version": get_engine().version}), status
+
+if ADMIN_TOKEN:
+    app.add_url_rule("/api/admin/reload-rules", view_func=api_reload_rules,
+                     methods=["POST"])
+
+# Lines computed per chunk on the streaming endpoint; bounds memory per request.
+STREAM_CHUNK_LINES = 1000
+
+def _compute_chunk(chunk: list, engine: CompensationCessEngine):
+    """
+    chunk holds (lineno, line_dict) pairs, or (lineno, error_message) for
+    lines that failed to parse. Yields NDJSON output lines in input order;
+    error entries use the input line number as their index.
+    """
+    valid = [line for _, line in chunk if isinstance(line, dict)]
+    computed = iter(calculate_taxes_for_lines(valid, engine=engine))
+    for lineno, line in chunk:
+        if isinstance(line, dict):
+            entry = next(computed)
+            if 'error' in entry:
+                entry = {'index': lineno, 'error': entry['error']}
+        else:
+            entry = {'index': lineno, 'error': line}
+        yield json.dumps(entry) + "\n"
+
+def stream_taxes(raw_lines, engine: Optional[CompensationCessEngine] = None,
+                 chunk_size: int = STREAM_CHUNK_LINES):
+    """
+    Generator over NDJSON: reads raw input lines (str or bytes) lazily and
+    yields one NDJSON result line per non-blank input line, computing
+    chunk_size lines at a time so memory stays bounded.
+    """
+    engine = engine or get_engine()
+    chunk = []
+    for lineno, raw in enumerate(raw_lines):
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8', errors='replace')
+        if not raw.strip():
+            continue
+        try:
+            line = json.loads(raw)
+            if not isinstance(line, dict):
+                line = "Expected a JSON object"
+        except ValueError as e:
+            line = f"Invalid JSON: {e}"
+        chunk.append((lineno, line))
+        if len(chunk) >= chunk_size:
+            yield from _compute_chunk(chunk, engine)
+            chunk = []
+    if chunk:
+        yield from _compute_chunk(chunk, engine)
+
+def _instrumented_stream(body, endpoint: str, started: float):
+    """
+    Streaming counterpart of _instrumented: the view returns before any
+    line is computed, so the request is timed and counted when the body
+    finishes. Status is 200 if it completes, 499 if the client went away
+    and 500 if computing it failed.
+    """
+    status = 500
+    try:
+        yield from body
+        status = 200
+    except GeneratorExit:
+        status = 499
+        raise
+    finally:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, (endpoint,))
+        REQUESTS.inc((endpoint, str(status)))
+
+@app.route("/api/taxes/stream", methods=["POST"])
+def api_taxes_stream():
+    """
+    Body: newline-delimited JSON, one line object per line. Streams back one
+    NDJSON result (or {"index", "error"} entry) per non-blank input line.
+    """
+    started = time.perf_counter()
+    engine = get_engine()
+    lines = iter(request.stream.readline, b'')
+    body = _instrumented_stream(stream_taxes(lines, engine), "api_taxes_stream", started)
+    return Response(stream_with_context(body), mimetype="application/x-ndjson")
+
 # —————————————————————————————————————————————————————
+# Command-Line Interface
+#
+#   python -m tax_engine compute in.csv out.csv [--chunk-size N] [--workers N]
+#   python -m tax_engine compile-rules cess_rules.json cess_rules.cessb
+#   python -m tax_engine serve [--host H] [--port P]
+#
+# compute reads the input chunk_size rows at a time, runs each chunk through
+# the vectorised batch path (or a BulkEvaluator with --workers) and appends
+# the chunk's results to the output before reading on, so memory depends on
+# the chunk size, not the file size. Paths ending in .parquet are read and
+# written with pyarrow, which is optional.
+
+CLI_CHUNK_LINES = 50_000
+
+OUTPUT_FIELDS = ('Index', 'HSN', 'Category', 'AssessableValue', 'Quantity',
+                 'WeightTonnes', 'CGST', 'SGST', 'IGST', 'CompensationCess',
+                 'TotalTax', 'RuleSetVersion', 'Error')
+
+_TRUE_STRINGS = {'1', 'true', 't', 'yes', 'y'}
+
+def _is_parquet(path: str) -> bool:
+    return path.lower().endswith('.parquet')
+
+def _require_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet files need pyarrow (pip install pyarrow)") from None
+    return pyarrow, pyarrow.parquet
+
+def _file_line(row: dict) -> dict:
+    """An input row as a line dict: empty cells dropped, interstate as a bool."""
+    line = {k: v for k, v in row.items() if v is not None and v != ''}
+    interstate = line.get('interstate')
+    if isinstance(interstate, str):
+        line['interstate'] = interstate.strip().lower() in _TRUE_STRINGS
+    return line
+
+def _read_chunks(path: str, chunk_size: int):
+    """Yield the rows of a CSV (header row required) or Parquet file in lists."""
+    if _is_parquet(path):
+        _, pq = _require_pyarrow()
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            yield rows
+
+class _CsvResultWriter:
+    def __init__(self, path: str):
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, OUTPUT_FIELDS)
+        self._writer.writeheader()
+
+    def write(self, rows: list):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+class _ParquetResultWriter:
+    def __init__(self, path: str):
+        pa, pq = _require_pyarrow()
+        money = pa.float64()
+        self._schema = pa.schema(
+            [('Index', pa.int64()), ('HSN', pa.string()), ('Category', pa.string())]
+            + [(f, money) for f in OUTPUT_FIELDS[3:11]]
+            + [('RuleSetVersion', pa.string()), ('Error', pa.string())])
+        self._table = pa.Table.from_pylist
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows: list):
+        self._writer.write_table(self._table(rows, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+def _output_row(index: int, result: dict) -> dict:
+    if 'error' in result:
+        return {'Index': index, 'Error': result['error']}
+    row = dict(result)
+    row['Index'] = index
+    row['HSN'] = str(row['HSN'])
+    row['Category'] = str(row['Category'])
+    return row
+
+def compute_file(src: str, dst: str, chunk_size: int = CLI_CHUNK_LINES,
+                 workers: Optional[int] = None, progress=None) -> dict:
+    """
+    Compute taxes for every row of src (CSV or Parquet, one line per row
+    with the calculate_taxes_for_line fields as columns) into dst, one
+    output row per input row with its 0-based Index. Invalid rows get an
+    Error and no amounts. progress(lines, errors, seconds) is called after
+    each chunk. Returns {'lines', 'errors', 'seconds'}.
+    """
+    if workers:
+        bulk = BulkEvaluator(workers)
+        evaluate = bulk.evaluate
+    else:
+        bulk = None
+        evaluate = partial(calculate_taxes_for_lines, engine=get_engine())
+    writer = (_ParquetResultWriter if _is_parquet(dst) else _CsvResultWriter)(dst)
+    lines = errors = 0
+    start = time.perf_counter()
+    try:
+        for rows in _read_chunks(src, chunk_size):
+            results = evaluate([_file_line(row) for row in rows])
+            errors += sum(1 for r in results if 'error' in r)
+            writer.write([_output_row(i, r) for i, r in enumerate(results, lines)])
+            lines += len(rows)
+            if progress:
+                progress(lines, errors, time.perf_counter() - start)
+    finally:
+        writer.close()
+        if bulk:
+            bulk.close()
+    return {'lines': lines, 'errors': errors, 'seconds': time.perf_counter() - start}
+
+def _print_progress(lines: int, errors: int, seconds: float):
+    rate = lines / seconds if seconds > 0 else 0.0
+    print(f"{lines:,} lines, {errors:,} errors, {rate:,.0f} lines/s",
+          file=sys.stderr, flush=True)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m tax_engine",
+                                     description="GST and Compensation Cess engine")
+    parser.set_defaults(command=None, host="0.0.0.0", port=8000)
+    commands = parser.add_subparsers(dest="command")
+    serve = commands.add_parser("serve", help="run the Flask API (development server)")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=8000)
+    compute = commands.add_parser("compute", help="compute taxes for a CSV/Parquet file")
+    compute.add_argument("input", help="input .csv or .parquet file")
+    compute.add_argument("output", help="output .csv or .parquet file")
+    compute.add_argument("--chunk-size", type=int, default=CLI_CHUNK_LINES,
+                         help=f"rows per chunk (default {CLI_CHUNK_LINES})")
+    compute.add_argument("--workers", type=int, default=None,
+                         help="evaluate in this many worker processes")
+    compute.add_argument("--audit", choices=AUDIT_MODES,
+                         help="audit logging mode for the run")
+    compute.add_argument("--quiet", action="store_true", help="no progress output")
+    bundle = commands.add_parser("compile-rules",
+                                 help="compile a rules file into a binary bundle")
+    bundle.add_argument("rules", help="cess_rules.json-style file")
+    bundle.add_argument("bundle", help=f"output bundle (*{RULE_BUNDLE_SUFFIX})")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile-rules":
+        try:
+            write_rule_bundle(_read_rules(args.rules), args.bundle)
+        except (OSError, ValueError) as e:
+            print(f"error: {e}", file=sys.stderr)
+            return 1
+        return 0
+    if args.command != "compute":
+        # For local testing only; in production run under WSGI
+        app.run(host=args.host, port=args.port, debug=False)
+        return 0
+
+    if args.audit:
+        configure_audit(args.audit)
+    try:
+        stats = compute_file(args.input, args.output, args.chunk_size, args.workers,
+                             progress=None if args.quiet else _print_progress)
+    except (OSError, ImportError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    if not args.quiet:
+        print(f"Done: {stats['lines']:,} lines ({stats['errors']:,} errors) "
+              f"in {stats['seconds']:.1f}s", file=sys.stderr)
+    return 0
+
 if __name__ == "__main__":
-    # For local testing only; in production run under WSGI
-    app.run(host="0.0.0.0", port=8000, debug=False)
+    sys.exit(main())
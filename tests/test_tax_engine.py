@@ -8,7 +8,7 @@ from tax_engine import CompensationCessEngine, GSTEngine, calculate_taxes_for_li
     ("22021010",  500,  0, None,  60.0),   # 12% of  500
     ("2701",        0,  0,   2.5, 1000.0),  # 2.5 tonnes × 400
     ("24022010", 10000, 1000, None, 10000*0.05 + 1591.0),
-    ("24021010", 1000,    0, None, max(1000*0.21, 4170.0/1000*1000)),
+    ("24021010", 1000, 1000, None, max(1000*0.21, 4170.0/1000*1000)),
     ("99999999",  1000,    1, None, 0.0)    # missing rule → 0
 ])
 def test_cess_engine(hsn, val, qty, wt, expected):
@@ -61,3 +61,1167 @@ def test_calculate_line_custom():
     assert result["CompensationCess"] == 0.0
     assert result["TotalTax"] == pytest.approx(180+180)
 
+
+# --- Shared Rule Registry Tests ---
+
+@pytest.fixture
+def fresh_registry(monkeypatch):
+    """Reset the process-wide rule registry for the duration of a test."""
+    import tax_engine
+    monkeypatch.setattr(tax_engine, "_shared_store", None)
+    monkeypatch.setattr(tax_engine, "_shared_engine", None)
+    monkeypatch.setattr(tax_engine, "_engine_expires_at", float("inf"))
+    monkeypatch.setattr(tax_engine, "_rules_signature", None)
+    return tax_engine
+
+def test_rules_loaded_once(monkeypatch, fresh_registry):
+    tax_engine = fresh_registry
+    calls = []
+    real_load = tax_engine._load_rules
+
+    def counting_load(*args, **kwargs):
+        calls.append(1)
+        return real_load(*args, **kwargs)
+
+    monkeypatch.setattr(tax_engine, "_load_rules", counting_load)
+
+    data = {"hsn": "21069020", "base_price": 1000, "gst_rate": 18}
+    for _ in range(5):
+        calculate_taxes_for_line(data)
+    CompensationCessEngine().calculate_cess("21069020", transaction_value=100)
+    assert len(calls) == 1
+
+def test_get_engine_is_shared_across_threads(fresh_registry):
+    import threading
+    tax_engine = fresh_registry
+
+    engines = []
+    threads = [threading.Thread(target=lambda: engines.append(tax_engine.get_engine()))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len({id(e) for e in engines}) == 1
+
+# --- Rule Compiler Tests ---
+
+def test_compile_rule_folds_constants():
+    from tax_engine import compile_rule
+    ev = compile_rule({"type": "combined", "rate_percent": 5.0,
+                       "fixed_rate": 1591.0, "unit_count": 1000})
+    assert ev.rate == 0.05
+    assert ev.per_unit == pytest.approx(1.591)
+    assert ev(10000, 1000, None) == pytest.approx(500 + 1591)
+
+def test_compile_rule_rejects_unknown_type():
+    from tax_engine import compile_rule
+    with pytest.raises(ValueError):
+        compile_rule({"type": "mystery"})
+
+# --- higher_of Tests ---
+
+@pytest.mark.parametrize("hsn,val,qty,expected", [
+    ("24021010", 100000, 1000, 21000.0),   # 21% beats 4170 per 1000 sticks
+    ("24021010",   1000, 1000,  4170.0),   # per-unit option wins
+    ("24029020",  10000, 1000,  4006.0),   # 12.5% = 1250 < 4006
+    ("24029020", 100000,    0, 12500.0),
+    ("24039990",   1000,    0,  2040.0),   # highest of 204/96/89 %
+])
+def test_higher_of_scores_options(hsn, val, qty, expected):
+    amt = CompensationCessEngine().calculate_cess(hsn, transaction_value=val, quantity=qty)
+    assert amt == pytest.approx(expected)
+
+def test_higher_of_does_not_reload_rules(monkeypatch):
+    import tax_engine
+    tax_engine.get_engine()
+
+    def fail_load(*args, **kwargs):
+        raise AssertionError("rules reloaded during evaluation")
+
+    monkeypatch.setattr(tax_engine, "_load_rules", fail_load)
+    for hsn in ("24021010", "24029020", "24039990"):
+        tax_engine.get_engine().calculate_cess(hsn, transaction_value=500, quantity=10)
+
+def test_higher_of_nested_options():
+    rules = {"X": {
+        "type": "higher_of",
+        "options": [
+            {"type": "ad_valorem", "rate_percent": 10.0},
+            {"type": "combined", "rate_percent": 1.0,
+             "fixed_rate": 100.0, "unit_count": 10},
+            {"type": "higher_of", "options": [
+                {"type": "per_weight", "rate_per_tonne": 400.0},
+                {"type": "fixed_per_unit", "fixed_rate": 50.0, "unit_count": 1},
+            ]},
+        ],
+    }}
+    engine = CompensationCessEngine(rules)
+    assert len(engine.ruleset.evaluators["X"].options) == 4
+    # 10% of 1000 = 100; combined = 10 + 5*10 = 60; 2 t * 400 = 800; 5 * 50 = 250
+    assert engine.calculate_cess("X", 1000, 5, 2) == pytest.approx(800.0)
+
+def test_higher_of_without_options_is_rejected():
+    engine = CompensationCessEngine({"X": {"type": "higher_of", "options": []}})
+    assert "X" not in engine.ruleset.rule_index
+    assert engine.calculate_cess("X", 1000, 1, 1) == 0.0
+
+# --- Batch Cess Tests ---
+
+def _scalar_or_none(x):
+    return None if x != x else float(x)
+
+def test_cess_batch_matches_scalar():
+    import numpy as np
+    from tax_engine import get_engine, get_rules
+    engine = get_engine()
+    rng = np.random.default_rng(7)
+    hsns = np.array(list(get_rules()) + ["99999999", "2701"])
+    n = 5000
+    hsn = rng.choice(hsns, n)
+    tv = rng.uniform(0, 100000, n).round(2)
+    qty = rng.integers(0, 5000, n).astype(float)
+    wt = rng.uniform(0, 30, n)
+    wt[rng.random(n) < 0.1] = np.nan   # some lines carry no weight
+
+    batch = engine.calculate_cess_batch(hsn, tv, qty, wt)
+    for i in range(n):
+        scalar = engine.calculate_cess(str(hsn[i]), tv[i], qty[i], _scalar_or_none(wt[i]))
+        assert batch[i] == scalar, (hsn[i], tv[i], qty[i], wt[i])
+
+def test_cess_batch_empty_and_missing_columns():
+    from tax_engine import get_engine
+    engine = get_engine()
+    assert len(engine.calculate_cess_batch([])) == 0
+    out = engine.calculate_cess_batch(["21069020", "2701"], [1000.0, 1000.0])
+    assert list(out) == [600.0, 0.0]   # per_weight without weight → 0
+
+# --- Batch GST Tests ---
+
+def test_round_amount_batch_matches_round():
+    import numpy as np
+    from tax_engine import round_amount, round_amount_batch
+    rng = np.random.default_rng(3)
+    values = rng.uniform(-1e6, 1e6, 20000).round(2) * rng.choice([0.0125, 0.09, 0.14], 20000)
+    values = np.concatenate([values, [0.125, 0.135, 2.675, 1.005, -0.125, 0.0, 1e-9]])
+    out = round_amount_batch(values)
+    for v, r in zip(values.tolist(), out.tolist()):
+        assert r == round_amount(v), v
+
+def test_gst_batch_matches_scalar_line_by_line():
+    import numpy as np
+    from tax_engine import round_amount
+    rng = np.random.default_rng(5)
+    n = 20000
+    values = rng.uniform(0, 250000, n).round(2)
+    rates = rng.choice([0.0, 0.25, 3.0, 5.0, 12.0, 18.0, 28.0], n)
+    inter = rng.random(n) < 0.4
+
+    eg = GSTEngine()
+    cgst, sgst, igst = eg.calculate_gst_batch(values, rates, inter)
+    rows = zip(values.tolist(), rates.tolist(), inter.tolist(),
+               cgst.tolist(), sgst.tolist(), igst.tolist())
+    for v, r, i, cg, sg, ig in rows:
+        expected = tuple(map(round_amount, eg.calculate_gst(v, r, i)))
+        assert (cg, sg, ig) == expected, (v, r, i)
+
+# --- Batch Line API Tests ---
+
+def _sample_lines(n, seed=11):
+    import random
+    from tax_engine import get_rules
+    rnd = random.Random(seed)
+    hsns = list(get_rules()) + ["99999999"]
+    lines = []
+    for _ in range(n):
+        lines.append({
+            "hsn": rnd.choice(hsns),
+            "base_price": round(rnd.uniform(1, 50000), 2),
+            "qty_uom": rnd.randint(0, 2000),
+            "weight_grams": rnd.choice([None, rnd.randint(0, 5_000_000)]),
+            "gst_rate": rnd.choice([0, 5, 12, 18, 28]),
+            "interstate": rnd.random() < 0.5,
+            "currency": rnd.choice(["INR", "INR", "USD", "EUR"]),
+            "category": rnd.choice(["Default", "Default", "Custom"]),
+        })
+    return lines
+
+@pytest.mark.parametrize("n", [5, 500])
+def test_calculate_taxes_for_lines_matches_single_line(n):
+    from tax_engine import calculate_taxes_for_lines
+    lines = _sample_lines(n)
+    assert calculate_taxes_for_lines(lines) == [calculate_taxes_for_line(l) for l in lines]
+
+@pytest.mark.parametrize("n", [3, 100])
+def test_calculate_taxes_for_lines_reports_bad_lines(n):
+    from tax_engine import calculate_taxes_for_lines
+    lines = _sample_lines(n)
+    lines[1] = {"base_price": 10}
+    lines[2] = {"hsn": "2701", "base_price": "abc"}
+    results = calculate_taxes_for_lines(lines)
+    assert results[1] == {"index": 1, "error": "Missing parameter: 'hsn'"}
+    assert results[2]["index"] == 2 and "error" in results[2]
+    assert results[0] == calculate_taxes_for_line(lines[0])
+
+def test_api_taxes_batch():
+    from tax_engine import app
+    client = app.test_client()
+    lines = _sample_lines(40) + [{"hsn": "2701"}]
+    resp = client.post("/api/taxes/batch", json={"lines": lines})
+    assert resp.status_code == 200
+    body = resp.get_json()
+    assert len(body["results"]) == 41
+    assert body["errors"] == 1
+    assert body["results"][-1]["index"] == 40
+    assert body["results"][0] == calculate_taxes_for_line(lines[0])
+
+    assert client.post("/api/taxes/batch", json={"hsn": "2701"}).status_code == 400
+
+# --- Streaming Endpoint Tests ---
+
+def test_stream_taxes_chunks_in_order():
+    import json
+    from tax_engine import stream_taxes
+    lines = _sample_lines(25)
+    raw = [json.dumps(l) + "\n" for l in lines]
+    raw.insert(3, "\n")                 # blank lines are skipped
+    raw.insert(7, "{not json\n")
+    raw.insert(12, "[1, 2]\n")
+    out = [json.loads(o) for o in stream_taxes(iter(raw), chunk_size=4)]
+    assert len(out) == 27
+    assert out[6]["index"] == 7 and out[6]["error"].startswith("Invalid JSON")
+    assert out[11] == {"index": 12, "error": "Expected a JSON object"}
+    expected = [calculate_taxes_for_line(l) for l in lines]
+    assert [o for o in out if "error" not in o] == expected
+
+def test_api_taxes_stream():
+    import json
+    from tax_engine import app
+    lines = _sample_lines(50) + [{"base_price": 1}]
+    body = "".join(json.dumps(l) + "\n" for l in lines)
+    resp = app.test_client().post("/api/taxes/stream", data=body,
+                                  content_type="application/x-ndjson")
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    out = [json.loads(o) for o in resp.get_data(as_text=True).splitlines()]
+    assert out[:50] == [calculate_taxes_for_line(l) for l in lines[:50]]
+    assert out[50] == {"index": 50, "error": "Missing parameter: 'hsn'"}
+
+# --- Async Logging Tests ---
+
+def test_async_logging_writes_on_disable(tmp_path):
+    import tax_engine
+    path = tmp_path / "async.log"
+    tax_engine.enable_async_logging(queue_size=1000, batch_size=16, path=str(path))
+    try:
+        for i in range(200):
+            tax_engine.logger.info(f"record {i}")
+    finally:
+        tax_engine.disable_async_logging()
+    lines = path.read_text().splitlines()
+    assert len(lines) == 200
+    assert lines[-1].endswith("record 199")
+    assert tax_engine.handler in tax_engine.logger.handlers
+
+def test_async_queue_handler_drops_when_full():
+    import logging
+    import queue
+    from tax_engine import _DroppingQueueHandler
+    qh = _DroppingQueueHandler(queue.Queue(maxsize=2))
+    for i in range(5):
+        qh.handle(logging.makeLogRecord({"msg": f"r{i}"}))
+    assert qh.dropped == 3
+    assert qh.queue.qsize() == 2
+
+# --- Audit Logging Tests ---
+
+@pytest.fixture
+def audit_records(caplog):
+    import logging
+    import tax_engine
+    caplog.set_level(logging.INFO, logger="TaxEngine.audit")
+    yield lambda: [r for r in caplog.records if r.name == "TaxEngine.audit"]
+    tax_engine.configure_audit()
+
+def test_audit_full_emits_compact_json(audit_records):
+    import json
+    data = {"hsn": "21069020", "base_price": 2000, "gst_rate": 18}
+    result = calculate_taxes_for_line(data)
+    records = audit_records()
+    assert len(records) == 1
+    payload = records[0].getMessage().split("Tax calc: ", 1)[1]
+    assert json.loads(payload) == result
+    assert " " not in payload
+
+def test_audit_sampled_and_threshold(audit_records):
+    import tax_engine
+    tax_engine.configure_audit('sampled', sample_every=10, threshold=5000)
+    small = {"hsn": "21069020", "base_price": 100, "gst_rate": 18}
+    large = {"hsn": "21069020", "base_price": 100000, "gst_rate": 18}
+    for _ in range(30):
+        calculate_taxes_for_line(small)
+    assert len(audit_records()) == 3
+    calculate_taxes_for_line(large)
+    assert len(audit_records()) == 4
+
+def test_audit_off(audit_records):
+    import tax_engine
+    tax_engine.configure_audit('off')
+    calculate_taxes_for_line({"hsn": "21069020", "base_price": 100})
+    assert audit_records() == []
+    with pytest.raises(ValueError):
+        tax_engine.configure_audit('verbose')
+
+def test_audit_record_is_a_snapshot():
+    import tax_engine
+    result = {f: 1 for f in tax_engine.AUDIT_FIELDS}
+    record = tax_engine._AuditRecord(result)
+    result['TotalTax'] = 2
+    assert '"TotalTax":1' in str(record)
+
+# --- Memory Regression Tests ---
+
+def test_no_engine_retention_over_100k_lines():
+    import gc
+    import tracemalloc
+    import tax_engine
+    tax_engine.configure_audit('off')
+    hsns = list(tax_engine.get_rules())
+    lines = [{"hsn": h, "base_price": 1000, "qty_uom": 10, "weight_grams": 5000,
+              "gst_rate": 18}
+             for h in hsns]
+    try:
+        tracemalloc.start()
+        for line in lines:
+            calculate_taxes_for_line(line)
+        gc.collect()
+        baseline = tracemalloc.get_traced_memory()[0]
+        for i in range(100_000):
+            line = lines[i % len(lines)]
+            engine = CompensationCessEngine()
+            engine._get_rule(line["hsn"])
+            calculate_taxes_for_line(line, engine=engine)
+        del engine
+        gc.collect()
+        growth = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+        tax_engine.configure_audit()
+    assert growth < 256 * 1024, f"retained {growth} bytes"
+
+# --- Fixed-Point (Paise) Tests ---
+
+def _decimal_paise(amount):
+    from decimal import Decimal, ROUND_HALF_UP
+    return int(amount.quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+def test_gst_paise_matches_decimal_reference():
+    import numpy as np
+    from decimal import Decimal
+    rng = np.random.default_rng(9)
+    values = rng.integers(0, 10**9, 5000)
+    rates = rng.choice([0, 2500, 30000, 50000, 120000, 180000, 280000], 5000)
+    inter = rng.random(5000) < 0.5
+    eg = GSTEngine()
+    cgst, sgst, igst = eg.calculate_gst_paise_batch(values, rates, inter)
+    for v, r, i, cg, ig in zip(values.tolist(), rates.tolist(), inter.tolist(),
+                               cgst.tolist(), igst.tolist()):
+        exact = Decimal(v) * Decimal(r) / Decimal(1_000_000)
+        if i:
+            assert (cg, ig) == (0, _decimal_paise(exact))
+        else:
+            assert (cg, ig) == (_decimal_paise(exact / 2), 0)
+        assert eg.calculate_gst_paise(v, r, i) == (cg, cg, ig)
+
+def test_gst_paise_rounds_half_away_from_zero():
+    eg = GSTEngine()
+    # 1 paisa at 50% is exactly half a paisa
+    assert eg.calculate_gst_paise(1, 500_000, True) == (0, 0, 1)
+    assert eg.calculate_gst_paise(-1, 500_000, True) == (0, 0, -1)
+    assert eg.calculate_gst_paise(10, 180_000, False) == (1, 1, 0)   # 0.9 → 1
+
+def test_cess_paise_batch_matches_scalar():
+    import numpy as np
+    from tax_engine import get_engine, get_rules
+    engine = get_engine()
+    rng = np.random.default_rng(13)
+    n = 5000
+    hsn = rng.choice(np.array(list(get_rules()) + ["99999999"]), n)
+    value = rng.integers(0, 10**9, n)
+    qty = rng.integers(0, 5_000_000, n)
+    grams = rng.integers(0, 30_000_000, n)
+    batch = engine.calculate_cess_paise_batch(hsn, value, qty, grams)
+    for i in range(n):
+        scalar = engine.calculate_cess_paise(str(hsn[i]), int(value[i]), int(qty[i]), int(grams[i]))
+        assert batch[i] == scalar
+
+def test_calculate_line_paise():
+    from tax_engine import calculate_taxes_for_line_paise
+    data = {"hsn": "24022010", "base_price": 10000, "qty_uom": 1000,
+            "gst_rate": 28, "interstate": True}
+    result = calculate_taxes_for_line_paise(data)
+    assert result["IGST"] == 280000
+    assert result["CompensationCess"] == 50000 + 159100
+    assert result["TotalTax"] == 280000 + 209100
+    assert result["AssessableValue"] == 1000000
+
+# --- HSN Prefix Resolution Tests ---
+
+@pytest.mark.parametrize("hsn,key", [
+    ("27011200", "2701"),            # coal tariff line → chapter head
+    ("2701", "2701"),
+    ("24039910", "24039910"),
+    ("2403991012", "24039910"),      # longer code → 8-digit rule
+    ("24039910_KHAINI", "24039910_KHAINI"),
+    ("87032391", None),              # 8703 only has variant keys
+    ("99999999", None),
+])
+def test_resolve_hsn_longest_prefix(hsn, key):
+    assert CompensationCessEngine().resolve_hsn(hsn) == key
+
+def test_prefix_rule_applies_in_scalar_and_batch():
+    from tax_engine import get_engine
+    engine = get_engine()
+    assert engine.calculate_cess("27011200", weight_tonnes=2.5) == 1000.0
+    out = engine.calculate_cess_batch(["27011200", "2701", "99999999"],
+                                      [0.0, 0.0, 0.0], None, [2.5, 1.0, 1.0])
+    assert list(out) == [1000.0, 400.0, 0.0]
+
+def test_resolve_cache_is_bounded(monkeypatch):
+    import tax_engine
+    monkeypatch.setattr(tax_engine, "RESOLVE_CACHE_SIZE", 10)
+    engine = CompensationCessEngine()
+    for i in range(25):
+        engine.resolve_hsn(f"2701{i:04d}")
+    assert len(engine._resolved) <= 10
+
+# --- Hot Reload Tests ---
+
+@pytest.fixture
+def rules_file(tmp_path, monkeypatch, fresh_registry):
+    import json
+    path = tmp_path / "cess_rules.json"
+    path.write_text(json.dumps({"21069020": {"type": "ad_valorem", "rate_percent": 60.0}}))
+    monkeypatch.setattr(fresh_registry, "RULES_PATH", str(path))
+    return path
+
+def _bump_mtime(path):
+    import os
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+def test_reload_swaps_rule_set_and_version(rules_file):
+    import json
+    import tax_engine
+    data = {"hsn": "21069020", "base_price": 1000}
+    old_engine = tax_engine.get_engine()
+    before = calculate_taxes_for_line(data)
+    assert before["CompensationCess"] == 600.0
+    assert before["RuleSetVersion"] == old_engine.version
+
+    assert tax_engine.reload_rules() is False          # unchanged file
+    rules_file.write_text(json.dumps({"21069020": {"type": "ad_valorem", "rate_percent": 12.0}}))
+    _bump_mtime(rules_file)
+    assert tax_engine.reload_rules() is True
+
+    after = calculate_taxes_for_line(data)
+    assert after["CompensationCess"] == 120.0
+    assert after["RuleSetVersion"] != before["RuleSetVersion"]
+    # An engine captured before the swap keeps computing with its own rules.
+    assert old_engine.calculate_cess("21069020", 1000) == 600.0
+
+def test_reload_keeps_rules_on_bad_file(rules_file):
+    import tax_engine
+    version = tax_engine.get_engine().version
+    rules_file.write_text("{not json")
+    _bump_mtime(rules_file)
+    assert tax_engine.reload_rules() is False
+    assert tax_engine.get_engine().version == version
+    assert calculate_taxes_for_line({"hsn": "21069020", "base_price": 10})["CompensationCess"] == 6.0
+
+def test_rules_watcher_and_admin_endpoint(rules_file):
+    import json
+    import time
+    import tax_engine
+    tax_engine.get_engine()
+    watcher = tax_engine.start_rules_watcher(interval=0.01)
+    try:
+        rules_file.write_text(json.dumps({"2701": {"type": "per_weight", "rate_per_tonne": 400.0}}))
+        _bump_mtime(rules_file)
+        deadline = time.time() + 5
+        while "2701" not in tax_engine.get_rules() and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        watcher.stop()
+    assert "2701" in tax_engine.get_rules()
+
+def test_admin_reload_requires_opt_in_and_token(rules_file, monkeypatch):
+    import tax_engine
+    # Not registered unless TAX_ENGINE_ADMIN_TOKEN is set at import.
+    assert tax_engine.app.test_client().post("/api/admin/reload-rules").status_code == 404
+
+    monkeypatch.setattr(tax_engine, "ADMIN_TOKEN", "s3cret")
+    for headers in ({}, {"Authorization": "Bearer wrong"}, {"Authorization": "s3cret"}):
+        with tax_engine.app.test_request_context(method="POST", headers=headers):
+            assert tax_engine.api_reload_rules()[1] == 401
+    with tax_engine.app.test_request_context(
+            method="POST", headers={"Authorization": "Bearer s3cret"}):
+        body, status = tax_engine.api_reload_rules()
+    assert status == 200
+    assert body.get_json()["version"] == tax_engine.get_engine().version
+
+# --- Effective-Dated Rule Tests ---
+
+DATED_RULES = {
+    "24021010": [
+        {"effective_from": "2017-07-01", "type": "ad_valorem", "rate_percent": 5.0},
+        {"effective_from": "2020-01-01", "type": "ad_valorem", "rate_percent": 10.0},
+        {"effective_from": "2023-04-01", "type": "higher_of", "options": [
+            {"type": "ad_valorem", "rate_percent": 21.0},
+            {"type": "fixed_per_unit", "fixed_rate": 4170.0, "unit_count": 1000},
+        ]},
+    ],
+    "2701": {"type": "per_weight", "rate_per_tonne": 400.0},
+    "8711": [{"effective_from": "2021-01-01", "type": "ad_valorem", "rate_percent": 3.0}],
+}
+
+@pytest.mark.parametrize("as_of,expected", [
+    ("2017-06-30", 0.0),     # before the first version
+    ("2017-07-01", 50.0),
+    ("2019-12-31", 50.0),
+    ("2020-01-01", 100.0),
+    ("2023-04-01", 4170.0),
+])
+def test_dated_rules_by_as_of(as_of, expected):
+    engine = CompensationCessEngine(DATED_RULES)
+    assert engine.calculate_cess("24021010", 1000, 1000, as_of=as_of) == expected
+
+def test_dated_rule_store_periods():
+    from datetime import date
+    from tax_engine import RuleStore
+    store = RuleStore(DATED_RULES)
+    assert len(store.rulesets) == 5   # always, 2017, 2020, 2021, 2023
+    assert "8711" not in store.at(date(2020, 6, 1)).rules
+    assert "8711" in store.at(date(2021, 6, 1)).rules
+    assert "2701" in store.at(date(2000, 1, 1)).rules
+    assert store.expiry(date(2030, 1, 1)) == float("inf")
+
+def test_dated_batch_buckets_match_scalar():
+    import numpy as np
+    engine = CompensationCessEngine(DATED_RULES)
+    rng = np.random.default_rng(17)
+    n = 2000
+    hsn = rng.choice(np.array(["24021010", "2701", "8711"]), n)
+    tv = rng.uniform(0, 10000, n)
+    qty = rng.integers(0, 2000, n).astype(float)
+    wt = rng.uniform(0, 5, n)
+    days = rng.integers(0, 3650, n)
+    as_of = np.datetime64("2016-01-01") + days.astype("timedelta64[D]")
+    batch = engine.calculate_cess_batch(hsn, tv, qty, wt, as_of=as_of)
+    for i in range(n):
+        scalar = engine.calculate_cess(str(hsn[i]), tv[i], qty[i], wt[i], as_of=str(as_of[i]))
+        assert batch[i] == scalar
+
+def test_dated_lines_carry_period_version():
+    from tax_engine import calculate_taxes_for_lines
+    engine = CompensationCessEngine(DATED_RULES)
+    lines = [{"hsn": "24021010", "base_price": 1000, "qty_uom": 0,
+              "as_of": d} for d in ("2018-01-01", "2021-01-01")] * 20
+    results = calculate_taxes_for_lines(lines, engine=engine)
+    assert [r["CompensationCess"] for r in results[:2]] == [50.0, 100.0]
+    assert results[0]["RuleSetVersion"] != results[1]["RuleSetVersion"]
+    assert results == [calculate_taxes_for_line(l, engine=engine) for l in lines]
+    bad = calculate_taxes_for_lines([{"hsn": "2701", "base_price": 1, "as_of": "yesterday"}] * 40,
+                                    engine=engine)
+    assert all("error" in r for r in bad)
+
+# --- FX Provider Tests ---
+
+@pytest.fixture
+def fx_provider():
+    import tax_engine
+    yield tax_engine.set_fx_provider
+    tax_engine.set_fx_provider(None)
+
+def test_default_fx_rates(fx_provider):
+    from tax_engine import convert_to_inr
+    assert convert_to_inr(10, "USD") == pytest.approx(825.0)
+    assert convert_to_inr(10, "eur") == pytest.approx(900.0)
+
+def test_file_fx_provider_dated_csv(tmp_path, fx_provider):
+    from tax_engine import FileFXProvider, convert_to_inr
+    path = tmp_path / "fx.csv"
+    path.write_text("currency,date,rate\n"
+                    "USD,2024-01-01,83.0\n"
+                    "USD,2024-07-01,84.0\n"
+                    "GBP,,105.0\n")
+    fx_provider(FileFXProvider(str(path)))
+    assert convert_to_inr(1, "USD", "2024-03-01") == 83.0
+    assert convert_to_inr(1, "USD", "2024-07-01") == 84.0
+    assert convert_to_inr(1, "GBP", "1999-01-01") == 105.0
+    # Before the first USD rate: no rate, passed through 1:1.
+    assert convert_to_inr(1, "USD", "2023-12-31") == 1
+
+def test_file_fx_provider_json_forms(tmp_path):
+    import json
+    from tax_engine import FileFXProvider
+    path = tmp_path / "fx.json"
+    path.write_text(json.dumps({"USD": 83.0, "EUR": {"2024-01-01": 90.0}}))
+    provider = FileFXProvider(str(path))
+    assert provider.rate("USD") == 83.0
+    assert provider.rate("EUR", "2024-02-01") == 90.0
+    path.write_text(json.dumps([{"currency": "JPY", "date": None, "rate": 0.55}]))
+    provider.refresh()
+    assert provider.rate("JPY") == 0.55
+    assert provider.rate("USD") is None
+
+def test_fx_unknown_currency_warns_once_per_period(caplog):
+    import logging
+    from tax_engine import StaticFXProvider
+    provider = StaticFXProvider()
+    caplog.set_level(logging.WARNING, logger="TaxEngine")
+    for _ in range(100):
+        assert provider.rate("XYZ") is None
+    assert sum("No FX rate for XYZ" in r.message for r in caplog.records) == 1
+    provider.refresh()
+    provider.rate("XYZ")
+    assert sum("No FX rate for XYZ" in r.message for r in caplog.records) == 2
+
+def test_fx_ttl_refresh_and_bad_reload(tmp_path, monkeypatch):
+    import tax_engine
+    from tax_engine import FileFXProvider
+    clock = [1000.0]
+    monkeypatch.setattr(tax_engine.time, "monotonic", lambda: clock[0])
+    path = tmp_path / "fx.csv"
+    path.write_text("currency,date,rate\nUSD,,83.0\n")
+    provider = FileFXProvider(str(path), ttl=60)
+    assert provider.rate("USD") == 83.0
+    path.write_text("currency,date,rate\nUSD,,84.0\n")
+    assert provider.rate("USD") == 83.0          # within the TTL
+    clock[0] += 61
+    assert provider.rate("USD") == 84.0
+    path.write_text("code,day,rate\nUSD,,85.0\n")
+    clock[0] += 61
+    assert provider.rate("USD") == 84.0          # bad file keeps the old table
+
+def test_fx_expiry_reloads_once_across_threads(monkeypatch):
+    import threading
+    import time
+    import tax_engine
+    loads = []
+
+    class SlowProvider(tax_engine.FXProvider):
+        def load(self):
+            loads.append(1)
+            time.sleep(0.05)
+            return [("USD", None, 83.0)]
+
+    provider = SlowProvider(ttl=60)
+    barrier = threading.Barrier(8)
+    def worker():
+        barrier.wait()
+        assert provider.rate("USD") == 83.0
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(loads) == 1
+    provider.refresh()                           # explicit refresh still reloads
+    assert len(loads) == 2
+
+# --- Batch FX Conversion Tests ---
+
+def test_convert_to_inr_batch_matches_scalar(tmp_path, fx_provider):
+    import numpy as np
+    from tax_engine import FileFXProvider, convert_to_inr, convert_to_inr_batch
+    path = tmp_path / "fx.csv"
+    path.write_text("currency,date,rate\n"
+                    "USD,2024-01-01,83.1\n"
+                    "USD,2024-07-01,84.2\n"
+                    "EUR,,90.3\n")
+    fx_provider(FileFXProvider(str(path)))
+    rnd = np.random.default_rng(5)
+    n = 1000
+    currencies = rnd.choice(["INR", "USD", "usd", "EUR", "XYZ"], n).tolist()
+    amounts = rnd.uniform(1, 1e5, n)
+    dates = [None if d < 0 else f"2024-{d % 12 + 1:02d}-15"
+             for d in rnd.integers(-3, 12, n)]
+    for on in (None, "2024-03-01", dates):
+        converted = amounts.copy()
+        unknown = convert_to_inr_batch(converted, currencies, on)
+        for i in range(n):
+            d = on[i] if isinstance(on, list) else on
+            expected = (amounts[i] if currencies[i] == "INR"
+                        else convert_to_inr(float(amounts[i]), currencies[i], d))
+            assert converted[i] == expected
+        assert unknown.tolist() == [c == "XYZ" for c in currencies]
+
+def test_mixed_currency_batch_lines(caplog, fx_provider):
+    import logging
+    from tax_engine import calculate_taxes_for_lines
+    caplog.set_level(logging.WARNING, logger="TaxEngine")
+    lines = [{"hsn": "21069020", "base_price": 100 + i, "gst_rate": 18,
+              "currency": ["INR", "USD", "EUR", "ABC"][i % 4]} for i in range(200)]
+    lines[7]["currency"] = None
+    results = calculate_taxes_for_lines(lines)
+    assert results[:7] == [calculate_taxes_for_line(l) for l in lines[:7]]
+    assert results[1]["AssessableValue"] == pytest.approx(101 * 82.5)
+    assert results[3]["AssessableValue"] == 103
+    assert "error" in results[7]
+    assert sum("No FX rate for ABC" in r.message for r in caplog.records) == 1
+
+# --- Invoice API Tests ---
+
+def test_invoice_totals_are_exact_and_header_applies():
+    from decimal import Decimal
+    from tax_engine import calculate_taxes_for_invoice
+    lines = [{"hsn": ["21069020", "22021010", "2701"][i % 3], "base_price": 0.1 * (i + 1),
+              "gst_rate": 18, "weight_grams": 1000} for i in range(50)]
+    lines[4]["interstate"] = False
+    lines.append({"hsn": "2701"})
+    invoice = calculate_taxes_for_invoice({"interstate": True, "currency": "INR",
+                                           "lines": lines})
+    valid = [r for r in invoice["lines"] if "error" not in r]
+    assert invoice["errors"] == 1 and len(valid) == 50
+    assert valid[0]["IGST"] > 0 and valid[0]["CGST"] == 0
+    assert valid[4]["CGST"] > 0 and valid[4]["IGST"] == 0
+    for field in ("CGST", "SGST", "IGST", "CompensationCess", "TotalTax"):
+        exact = sum(Decimal(str(r[field])) for r in valid)
+        assert Decimal(str(invoice["totals"][field])) == exact
+    subtotals = invoice["hsn_subtotals"]
+    assert list(subtotals) == ["21069020", "22021010", "2701"]
+    assert sum(s["Lines"] for s in subtotals.values()) == invoice["totals"]["Lines"] == 50
+    assert sum(Decimal(str(s["TotalTax"])) for s in subtotals.values()) == \
+        Decimal(str(invoice["totals"]["TotalTax"]))
+
+def test_invoice_assessable_value_total_matches_fx_lines(tmp_path, fx_provider):
+    from decimal import Decimal
+    from tax_engine import FileFXProvider, calculate_taxes_for_invoice
+    path = tmp_path / "fx.csv"
+    path.write_text("currency,date,rate\nUSD,,83.123\n")
+    fx_provider(FileFXProvider(str(path)))
+    lines = [{"hsn": "2701", "base_price": 0.205} for _ in range(40)]
+    invoice = calculate_taxes_for_invoice({"currency": "USD", "lines": lines})
+    shown = sum(Decimal(str(r["AssessableValue"])) for r in invoice["lines"])
+    assert Decimal(str(invoice["totals"]["AssessableValue"])) == shown
+    assert invoice["lines"][0]["AssessableValue"] == 17.04
+
+def test_api_taxes_invoice():
+    from tax_engine import app
+    client = app.test_client()
+    body = {"currency": "USD", "lines": [{"hsn": "21069020", "base_price": 10, "gst_rate": 18}]}
+    resp = client.post("/api/taxes/invoice", json=body)
+    assert resp.status_code == 200
+    result = resp.get_json()
+    assert result["lines"][0]["AssessableValue"] == pytest.approx(825.0)
+    assert result["totals"]["CompensationCess"] == pytest.approx(495.0)
+    assert client.post("/api/taxes/invoice", json={"lines": "x"}).status_code == 400
+    assert client.post("/api/taxes/invoice", json=[1]).status_code == 400
+
+# --- Bulk Evaluator Tests ---
+
+def test_bulk_evaluator_matches_single_process():
+    from tax_engine import BulkEvaluator, calculate_taxes_for_lines
+    lines = _sample_lines(300) + [{"hsn": "2701"}] + _sample_lines(40, seed=3)
+    with BulkEvaluator(workers=2, chunk_size=64) as bulk:
+        results = bulk.evaluate(lines)
+    assert results == calculate_taxes_for_lines(lines)
+    assert results[300] == {"index": 300, "error": "Missing parameter: 'base_price'"}
+
+def test_bulk_evaluator_uses_given_store():
+    import pickle
+    from tax_engine import BulkEvaluator, RuleStore, calculate_taxes_for_lines
+    store = RuleStore(DATED_RULES)
+    clone = pickle.loads(pickle.dumps(store))
+    assert [rs.version for rs in clone.rulesets] == [rs.version for rs in store.rulesets]
+    engine = CompensationCessEngine(ruleset=store.current(), store=store)
+    lines = [{"hsn": "24021010", "base_price": 1000, "qty_uom": 0,
+              "as_of": d} for d in ("2018-01-01", "2021-01-01")] * 20
+    with BulkEvaluator(workers=1, chunk_size=7, store=store) as bulk:
+        assert bulk.evaluate(lines) == calculate_taxes_for_lines(lines, engine=engine)
+        assert bulk.evaluate([]) == []
+
+def test_bulk_workers_write_logs_under_async_logging(tmp_path):
+    import multiprocessing
+    import tax_engine
+    from tax_engine import BulkEvaluator
+    path = tmp_path / "async.log"
+    tax_engine.enable_async_logging(path=str(path))
+    try:
+        # Forked workers inherit the queue handler but not the writer thread.
+        ctx = multiprocessing.get_context("fork")
+        with BulkEvaluator(workers=2, chunk_size=50, mp_context=ctx) as bulk:
+            bulk.evaluate(_sample_lines(200))
+    finally:
+        tax_engine.disable_async_logging()
+    assert path.read_text().count("Tax calc:") == 200
+
+# --- File CLI Tests ---
+
+def _write_input_csv(path, n):
+    import csv
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["hsn", "base_price", "qty_uom", "weight_grams", "gst_rate",
+                         "interstate", "currency"])
+        for i in range(n):
+            writer.writerow([["21069020", "2701", "24022010"][i % 3], 100 + i, i % 7,
+                             "" if i % 2 else 250000, 18, ["true", "false", ""][i % 3],
+                             ["INR", "USD"][i % 2]])
+        writer.writerow(["2701", "", "", "", "", "", ""])
+
+def test_compute_file_csv_matches_batch(tmp_path):
+    import csv
+    from tax_engine import calculate_taxes_for_lines, compute_file
+    src, dst = tmp_path / "in.csv", tmp_path / "out.csv"
+    _write_input_csv(src, 100)
+    seen = []
+    stats = compute_file(str(src), str(dst), chunk_size=30,
+                         progress=lambda *a: seen.append(a[:2]))
+    assert stats["lines"] == 101 and stats["errors"] == 1
+    assert seen == [(30, 0), (60, 0), (90, 0), (101, 1)]
+    with open(dst, newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [int(r["Index"]) for r in rows] == list(range(101))
+    assert rows[-1]["Error"] == "Missing parameter: 'base_price'"
+    expected = calculate_taxes_for_lines([
+        {"hsn": ["21069020", "2701", "24022010"][i % 3], "base_price": str(100 + i),
+         "qty_uom": str(i % 7), "gst_rate": "18", "interstate": i % 3 == 0,
+         "currency": ["INR", "USD"][i % 2], **({} if i % 2 else {"weight_grams": "250000"})}
+        for i in range(100)])
+    for row, result in zip(rows, expected):
+        assert float(row["TotalTax"]) == result["TotalTax"]
+        assert float(row["IGST"]) == result["IGST"]
+        assert row["RuleSetVersion"] == result["RuleSetVersion"]
+
+def test_compute_file_parquet_round_trip(tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    from tax_engine import compute_file
+    src = tmp_path / "in.csv"
+    _write_input_csv(src, 50)
+    compute_file(str(src), str(tmp_path / "out.parquet"), chunk_size=16)
+    compute_file(str(src), str(tmp_path / "out.csv"))
+    table = pq.read_table(tmp_path / "out.parquet").to_pylist()
+    assert len(table) == 51
+    assert table[-1]["Error"] and table[-1]["TotalTax"] is None
+    assert table[0]["TotalTax"] > 0
+
+def test_cli_main(tmp_path, capsys):
+    from tax_engine import main
+    src = tmp_path / "in.csv"
+    _write_input_csv(src, 5)
+    assert main(["compute", str(src), str(tmp_path / "out.csv"), "--quiet"]) == 0
+    assert (tmp_path / "out.csv").read_text().count("\n") == 7
+    assert main(["compute", str(tmp_path / "missing.csv"), str(tmp_path / "x.csv")]) == 1
+    assert "error:" in capsys.readouterr().err
+
+# --- Rule Bundle Tests ---
+
+def test_rule_bundle_round_trip(tmp_path):
+    import json
+    import numpy as np
+    from tax_engine import RULES_PATH, RuleStore, load_rule_bundle, write_rule_bundle
+    with open(RULES_PATH) as f:
+        raw = json.load(f)
+    raw.update(DATED_RULES)
+    path = str(tmp_path / "rules.cessb")
+    write_rule_bundle(raw, path)
+    mapped, parsed = load_rule_bundle(path), RuleStore(raw)
+    assert mapped.starts == parsed.starts
+    assert [r.version for r in mapped.rulesets] == [r.version for r in parsed.rulesets]
+    assert [r.rules for r in mapped.rulesets] == [r.rules for r in parsed.rulesets]
+    assert isinstance(mapped.current().table.rate, memoryview)
+
+    a = CompensationCessEngine(ruleset=mapped.current(), store=mapped)
+    b = CompensationCessEngine(ruleset=parsed.current(), store=parsed)
+    rng = np.random.default_rng(2)
+    hsn = rng.choice(np.array(list(raw) + ["27011200", "99"]), 500).tolist()
+    tv, qty, wt = rng.uniform(0, 1e5, 500), rng.integers(0, 100, 500), rng.uniform(0, 5, 500)
+    dates = np.datetime64("2016-01-01") + rng.integers(0, 3650, 500).astype("timedelta64[D]")
+    assert (a.calculate_cess_batch(hsn, tv, qty, wt, as_of=dates)
+            == b.calculate_cess_batch(hsn, tv, qty, wt, as_of=dates)).all()
+    for i in range(50):
+        assert a.calculate_cess(hsn[i], tv[i], qty[i], wt[i]) == \
+            b.calculate_cess(hsn[i], tv[i], qty[i], wt[i])
+        assert a.calculate_cess_paise(hsn[i], 12345 * i, 1000 * i, 7 * i) == \
+            b.calculate_cess_paise(hsn[i], 12345 * i, 1000 * i, 7 * i)
+
+def test_rule_bundle_rejects_corruption(tmp_path):
+    from tax_engine import load_rule_bundle, write_rule_bundle
+    path = tmp_path / "rules.cessb"
+    write_rule_bundle({"2701": {"type": "per_weight", "rate_per_tonne": 400.0}}, str(path))
+    data = bytearray(path.read_bytes())
+    data[-3] ^= 0xFF
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checksum"):
+        load_rule_bundle(str(path))
+    data[8] = 99     # format version
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="format"):
+        load_rule_bundle(str(path))
+    path.write_text("{}")
+    with pytest.raises(ValueError, match="not a cess rule bundle"):
+        load_rule_bundle(str(path))
+
+def test_registry_loads_bundle_and_pickles(tmp_path, monkeypatch, fresh_registry):
+    import pickle
+    from tax_engine import get_engine, get_store, load_rule_bundle, main, write_rule_bundle
+    src = tmp_path / "rules.json"
+    src.write_text('{"2701": {"type": "per_weight", "rate_per_tonne": 400.0}}')
+    path = tmp_path / "rules.cessb"
+    assert main(["compile-rules", str(src), str(path)]) == 0
+    monkeypatch.setattr(fresh_registry, "RULES_PATH", str(path))
+    assert get_engine().calculate_cess("2701", 0, 0, 2.0) == 800.0
+    clone = pickle.loads(pickle.dumps(get_store()))
+    assert clone.current().rules == get_store().current().rules
+    empty = tmp_path / "empty.cessb"
+    write_rule_bundle({}, str(empty))
+    assert len(load_rule_bundle(str(empty)).current()) == 0
+
+# --- Metrics Tests ---
+
+def test_counter_shards_sum_across_threads():
+    import threading
+    from tax_engine import Counter, MetricsRegistry
+    counter = Counter("test_sharded", "test counter", ("k",), registry=MetricsRegistry())
+    threads = [threading.Thread(target=lambda: [counter.inc(("a",)) for _ in range(10_000)])
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert counter.value(("a",)) == 80_000
+    assert 'test_sharded_total{k="a"} 80000' in list(counter.samples())
+
+def test_exited_threads_fold_their_shards():
+    import threading
+    from tax_engine import Histogram, MetricsRegistry, REQUESTS, app
+    hist = Histogram("test_folded", "test histogram", buckets=(1.0,),
+                     registry=MetricsRegistry())
+    for _ in range(50):
+        t = threading.Thread(target=hist.observe, args=(0.5,))
+        t.start()
+        t.join()
+    assert len(hist._shards) == 0
+    assert list(hist.samples())[-1] == "test_folded_count 50"
+    # A thread-per-request server, as `python -m tax_engine serve` runs.
+    client = app.test_client()
+    before = REQUESTS.value(("api_taxes", "200"))
+    for _ in range(20):
+        t = threading.Thread(target=client.get, args=("/api/taxes?hsn=2701&base_price=1",))
+        t.start()
+        t.join()
+    assert REQUESTS.value(("api_taxes", "200")) == before + 20
+    assert len(REQUESTS._shards) <= 2
+
+def test_histogram_exposition():
+    from tax_engine import Histogram, MetricsRegistry
+    registry = MetricsRegistry()
+    hist = Histogram("test_latency", "test histogram", buckets=(0.1, 1.0), registry=registry)
+    for v in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(v)
+    assert list(hist.samples()) == [
+        'test_latency_bucket{le="0.1"} 2',
+        'test_latency_bucket{le="1.0"} 3',
+        'test_latency_bucket{le="+Inf"} 4',
+        "test_latency_sum 3.65",
+        "test_latency_count 4",
+    ]
+    assert registry.render().startswith("# HELP test_latency test histogram\n"
+                                        "# TYPE test_latency histogram\n")
+
+def test_metrics_endpoint_counts_requests_and_cess():
+    from tax_engine import (CESS_EVALUATIONS, CESS_RULE_MISSES, REQUESTS, app,
+                            calculate_taxes_for_lines)
+    client = app.test_client()
+    ok, bad = REQUESTS.value(("api_taxes", "200")), REQUESTS.value(("api_taxes", "400"))
+    per_weight = CESS_EVALUATIONS.value(("per_weight",))
+    misses = CESS_RULE_MISSES.value()
+    client.get("/api/taxes?hsn=2701&base_price=100&weight_grams=1000000")
+    client.get("/api/taxes?hsn=2701")
+    calculate_taxes_for_lines([{"hsn": "2701", "base_price": 1}] * 40
+                              + [{"hsn": "99999999", "base_price": 1}] * 3)
+    assert REQUESTS.value(("api_taxes", "200")) == ok + 1
+    assert REQUESTS.value(("api_taxes", "400")) == bad + 1
+    assert CESS_EVALUATIONS.value(("per_weight",)) == per_weight + 41
+    assert CESS_RULE_MISSES.value() == misses + 3
+    resp = client.get("/metrics")
+    assert resp.status_code == 200 and resp.mimetype == "text/plain"
+    text = resp.get_data(as_text=True)
+    assert "# TYPE tax_engine_request_duration_seconds histogram" in text
+    assert "# TYPE tax_engine_requests_total counter" in text
+    assert "# HELP tax_engine_requests_total " in text
+    assert 'tax_engine_request_duration_seconds_count{endpoint="api_taxes"}' in text
+    assert "tax_engine_ruleset_load_seconds" in text
+
+def test_stream_metrics_cover_the_whole_body(monkeypatch):
+    import time
+    import tax_engine
+    def slow_stream(lines, engine):
+        time.sleep(0.05)
+        yield "{}\n"
+    monkeypatch.setattr(tax_engine, "stream_taxes", slow_stream)
+    def recorded_seconds():
+        key = 'tax_engine_request_duration_seconds_sum{endpoint="api_taxes_stream"} '
+        return sum(float(s[len(key):]) for s in tax_engine.REQUEST_SECONDS.samples()
+                   if s.startswith(key))
+    ok = tax_engine.REQUESTS.value(("api_taxes_stream", "200"))
+    seconds = recorded_seconds()
+    resp = tax_engine.app.test_client().post("/api/taxes/stream", data="{}\n")
+    assert resp.get_data(as_text=True) == "{}\n"
+    assert tax_engine.REQUESTS.value(("api_taxes_stream", "200")) == ok + 1
+    assert recorded_seconds() - seconds >= 0.05
+
+# --- Stage Timing Tests ---
+
+LINE_STAGES = ["parse", "currency", "gst", "cess", "rounding", "audit"]
+
+def test_stage_stats_for_line_and_batch():
+    from tax_engine import StageStats, calculate_taxes_for_lines
+    stats = StageStats()
+    line = {"hsn": "21069020", "base_price": 100, "gst_rate": 18, "currency": "USD"}
+    assert calculate_taxes_for_line(line, sink=stats) == calculate_taxes_for_line(line)
+    calculate_taxes_for_lines([line] * 50, sink=stats)
+    calculate_taxes_for_lines([line] * 3, sink=stats)
+    snap = stats.snapshot()
+    assert list(snap["line"]) == LINE_STAGES
+    assert snap["line"]["gst"]["calls"] == 4
+    assert list(snap["lines"]) == ["parse", "currency", "gst", "cess", "rounding", "results"]
+    assert snap["lines"]["cess"] == {**snap["lines"]["cess"], "calls": 1, "lines": 50}
+    assert all(s["total_ns"] >= s["max_ns"] > 0 for s in snap["line"].values())
+    stats.reset()
+    assert stats.snapshot() == {}
+
+def test_installed_stage_sink_and_file_sink(tmp_path):
+    import json
+    from tax_engine import StageFileSink, set_stage_sink
+    sink = StageFileSink(str(tmp_path / "stages.jsonl"))
+    set_stage_sink(sink)
+    try:
+        calculate_taxes_for_line({"hsn": "2701", "base_price": 1})
+    finally:
+        set_stage_sink(None)
+        sink.close()
+    calculate_taxes_for_line({"hsn": "2701", "base_price": 1})
+    entries = [json.loads(l) for l in (tmp_path / "stages.jsonl").read_text().splitlines()]
+    assert len(entries) == 1
+    assert entries[0]["path"] == "line" and list(entries[0]["timings_ns"]) == LINE_STAGES
+
+def test_debug_header_returns_timings():
+    from tax_engine import DEBUG_TIMINGS_HEADER, app
+    client = app.test_client()
+    url = "/api/taxes?hsn=21069020&base_price=100"
+    assert "StageTimingsNs" not in client.get(url).get_json()
+    body = client.get(url, headers={DEBUG_TIMINGS_HEADER: "1"}).get_json()
+    assert sorted(body["StageTimingsNs"]) == sorted(LINE_STAGES)
+    batch = client.post("/api/taxes/batch", json=_sample_lines(40),
+                        headers={DEBUG_TIMINGS_HEADER: "true"}).get_json()
+    assert "results" in batch["StageTimingsNs"]
+
+# --- Result Cache Tests ---
+
+def test_result_cache_hits_match_uncached(audit_records):
+    from tax_engine import ResultCache
+    cache = ResultCache(maxsize=8)
+    data = {"hsn": "21069020", "base_price": "1000", "gst_rate": 18}
+    first = cache.calculate(data)
+    first["TotalTax"] = -1                      # callers get copies
+    second = cache.calculate({"hsn": "21069020", "base_price": 1000.0, "gst_rate": 18})
+    assert second == calculate_taxes_for_line(data)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+    assert len(audit_records()) == 3            # hits are audited too
+
+def test_result_cache_lru_eviction_and_ttl(monkeypatch):
+    import tax_engine
+    from tax_engine import ResultCache
+    clock = [1000.0]
+    monkeypatch.setattr(tax_engine.time, "monotonic", lambda: clock[0])
+    cache = ResultCache(maxsize=2, ttl=10)
+    a, b, c = ({"hsn": "2701", "base_price": p} for p in (1, 2, 3))
+    cache.calculate(a)
+    cache.calculate(b)
+    cache.calculate(a)                          # a is now most recent
+    cache.calculate(c)                          # evicts b
+    cache.calculate(a)
+    assert cache.stats()["evictions"] == 1 and cache.stats()["hits"] == 2
+    clock[0] += 11
+    cache.calculate(a)
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["misses"] == 4
+    cache.clear()
+    assert cache.stats()["size"] == 0
+
+def test_result_cache_invalidated_by_rule_reload(rules_file):
+    import json
+    import tax_engine
+    cache = tax_engine.ResultCache()
+    data = {"hsn": "21069020", "base_price": 1000}
+    assert cache.calculate(data)["CompensationCess"] == 600.0
+    rules_file.write_text(json.dumps({"21069020": {"type": "ad_valorem", "rate_percent": 12.0}}))
+    _bump_mtime(rules_file)
+    assert tax_engine.reload_rules() is True
+    assert cache.calculate(data)["CompensationCess"] == 120.0
+    assert cache.stats()["hits"] == 0
+
+def test_result_cache_invalidated_by_fx_refresh(tmp_path, fx_provider):
+    from tax_engine import FileFXProvider, ResultCache
+    path = tmp_path / "fx.csv"
+    path.write_text("currency,date,rate\nUSD,,83.0\n")
+    provider = FileFXProvider(str(path))
+    fx_provider(provider)
+    cache = ResultCache()
+    data = {"hsn": "2701", "base_price": 10, "currency": "USD"}
+    assert cache.calculate(data)["AssessableValue"] == 830.0
+    provider.refresh()                          # same rates: still a hit
+    assert cache.calculate(data)["AssessableValue"] == 830.0
+    path.write_text("currency,date,rate\nUSD,,84.0\n")
+    provider.refresh()
+    assert cache.calculate(data)["AssessableValue"] == 840.0
+    assert cache.stats()["hits"] == 1
+
+def test_result_cache_follows_dated_fx_rates(tmp_path, fx_provider, monkeypatch):
+    import datetime
+    import tax_engine
+    from tax_engine import FileFXProvider, ResultCache
+    today = [datetime.date(2026, 10, 18)]
+
+    class FakeDate(datetime.date):
+        @classmethod
+        def today(cls):
+            return today[0]
+
+    monkeypatch.setattr(tax_engine, "date", FakeDate)
+    path = tmp_path / "fx.csv"
+    path.write_text("currency,date,rate\nUSD,,80.0\nUSD,2026-10-19,90.0\n")
+    fx_provider(FileFXProvider(str(path)))
+    cache = ResultCache(ttl=None)
+    data = {"hsn": "2701", "base_price": 1, "currency": "USD"}
+    assert cache.calculate(data)["AssessableValue"] == 80.0
+    today[0] = datetime.date(2026, 10, 19)
+    assert cache.calculate(data)["AssessableValue"] == 90.0
+    assert calculate_taxes_for_line(data)["AssessableValue"] == 90.0
+
+def test_result_cache_threaded_and_api():
+    from concurrent.futures import ThreadPoolExecutor
+    import tax_engine
+    cache = tax_engine.ResultCache(maxsize=32)
+    lines = [{"hsn": "21069020", "base_price": i % 48} for i in range(2000)]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(cache.calculate, lines))
+    assert [r["AssessableValue"] for r in results] == [l["base_price"] for l in lines]
+    stats = cache.stats()
+    assert stats["hits"] + stats["misses"] == 2000 and stats["size"] <= 32
+
+    cache.calculate({"hsn": "21069020", "base_price": 5})
+    stats = cache.stats()
+    tax_engine.set_result_cache(cache)
+    try:
+        client = tax_engine.app.test_client()
+        body = client.get("/api/taxes?hsn=21069020&base_price=5").get_json()
+    finally:
+        tax_engine.set_result_cache(None)
+    assert body["AssessableValue"] == 5.0
+    assert cache.stats()["hits"] == stats["hits"] + 1